@@ -1,11 +1,14 @@
-import sys, os, json, re, math
+import sys, os, json, re, math, ast
 from pathlib import Path
 from collections import Counter
 from datetime import datetime, timedelta
 import calendar
 import statistics  # Add statistics import at top level
 import time
-import traceback
+from functools import lru_cache
+from itertools import count
+from bisect import bisect_left
+from operator import mul
 
 import pint
 ureg = pint.UnitRegistry()
@@ -14,7 +17,7 @@ ureg = pint.UnitRegistry()
 from constants import (
     FALLBACK_RATES, CURRENCY_ABBR, CURRENCY_DISPLAY,
     UNIT_ABBR, UNIT_DISPLAY, MATH_FUNCS, COLORS, LN_COLORS, 
-    FUNCTION_NAMES, DEFAULT_FPS, lcm
+    FUNCTION_NAMES, DEFAULT_FPS, EXCHANGE_RATE_TTL, EXCHANGE_RATE_RETRY_TTL, lcm
 )
 
 # Add currency conversion support
@@ -24,31 +27,117 @@ try:
 except ImportError:
     CURRENCY_API_AVAILABLE = False
 
+# Faster worksheet save/load when orjson is installed; stdlib json otherwise
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Console diagnostics for the result-protection and mass-delete paths, and the
+# editors' performance log. These run on every evaluation and keystroke, so they
+# stay off unless CALCFORGE_DEBUG=1 is set when the app starts.
+DEBUG_OUTPUT = os.environ.get('CALCFORGE_DEBUG') == '1'
+
 class TimecodeError(Exception):
     pass
 
+# Month lookups for parse_date: abbreviations for three-letter words, full names otherwise
+_MONTH_ABBREVIATIONS = {name.lower(): number for number, name in enumerate(calendar.month_abbr) if name}
+_MONTH_NAMES = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+
+# Patterns used by the evaluation helpers, compiled once at import rather than
+# looked up in re's pattern cache on every call
+_NON_DIGIT_RE = re.compile(r'[^\d]')
+_MONTH_NAME_DATE_RE = re.compile(r'([A-Za-z]+)\s+(3[01]|[12]\d|0[1-9]|[1-9]),\s*(\d{4})')
+_DATE_TERM = r'([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)'
+_DATE_PATTERNS = [re.compile(p) for p in (
+    # Two dates with subtraction - handle spaces in dates and W- syntax
+    _DATE_TERM + r'\s*W\s*-\s*' + _DATE_TERM,  # Date range with W-
+    _DATE_TERM + r'\s*-\s*' + _DATE_TERM,       # Date range without W
+    # Date plus/minus days - handle spaces and optional W
+    _DATE_TERM + r'\s*W\s*([+\-])\s*(\d+)',  # With W
+    _DATE_TERM + r'\s*([+\-])\s*(\d+)',       # Without W
+    # Single date
+    '^' + _DATE_TERM + '$',
+)]
+
+def _possible_date_patterns(has_w, has_minus, has_plus):
+    """Return the _DATE_PATTERNS, in order, that can match given which of W, - and + occur"""
+    w_range, date_range, w_offset, offset, single = _DATE_PATTERNS
+    patterns = []
+    if has_minus:
+        if has_w:
+            patterns.append(w_range)
+        patterns.append(date_range)
+    if has_minus or has_plus:
+        if has_w:
+            patterns.append(w_offset)
+        patterns.append(offset)
+    else:
+        patterns.append(single)
+    return tuple(patterns)
+
+# ('W' in expr, '-' in expr, '+' in expr) -> candidate date patterns
+_DATE_PATTERN_TIERS = {
+    (has_w, has_minus, has_plus): _possible_date_patterns(has_w, has_minus, has_plus)
+    for has_w in (False, True) for has_minus in (False, True) for has_plus in (False, True)
+}
+_TIMECODE_RE = re.compile(r'^\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}$')
+_TIMECODE_TEXT_RE = re.compile(r'\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}')
+_SPACED_TIMECODE_RE = re.compile(r'\d{1,2}\s*[:.]\s*\d{1,2}\s*[:.]\s*\d{1,2}\s*[:.]\s*\d{1,2}')
+_WHITESPACE_RE = re.compile(r'\s+')
+_TC_CALL_RE = re.compile(r'TC\((.*?)\)')
+_AR_CALL_RE = re.compile(r'AR\((.*?)\)', re.IGNORECASE)
+# Numbers with thousands separators (1,234 or 1,234.56), skipping function arguments
+_THOUSANDS_NUMBER_RE = re.compile(r'(?<!\()\b\d{1,3}(?:,\d{3})*(?:\.\d+)?\b(?![^()]*\))')
+_LEADING_ZEROS_RE = re.compile(r'\b0+(\d+)\b')
+_LEADING_NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+')
+_TC_TOKEN_RE = re.compile(r'[+\-*/]|[^\s+\-*/]+')
+_AR_ORIGINAL_RE = re.compile(r'(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)', re.IGNORECASE)
+_AR_TARGET_RE = re.compile(r'(\?|\d+(?:\.\d+)?)x(\?|\d+(?:\.\d+)?)', re.IGNORECASE)
+# Both conversion forms in one match: groups 1-3 are the unit form (only set when
+# it matches at the very start), groups 4-6 the currency form on the stripped text
+_CONVERSION_RE = re.compile(
+    r'(?:(?=(\d+(?:\.\d+)?)\s+(\w+)\s+to\s+(\w+))|)\s*([\d.]+)\s+(.+?)\s+to\s+(.+?)\s*$',
+    re.IGNORECASE)
+_LN_REF_RE = re.compile(r'\b(?:s\.|S\.)?(?:ln|LN)\d+\b', re.IGNORECASE)
+_CROSS_SHEET_REF_RE = re.compile(r'\bS\.[^.]+\.LN\d+\b', re.IGNORECASE)
+_CROSS_SHEET_NAME_RE = re.compile(r'\bS\.([^.]+)\.LN\d+\b', re.IGNORECASE)
+# Line categories used to pick the evaluation timer interval
+_LN_WORD_RE = re.compile(r'\bLN\d+\b', re.IGNORECASE)
+_SPECIAL_FUNCTION_CALL_RE = re.compile(r'\b(?:TC|AR|truncate|mean|TR)\s*\(', re.IGNORECASE)
+_SIMPLE_MATH_RE = re.compile(r'^[0-9\s+\-*/().]+$')
+_DATE_CALL_RE = re.compile(r'D\((.*?)\)')
+_TRUNCATE_CALL_RE = re.compile(r'(?:truncate|TR)\((.*?),(.*?)\)')
+_SPECIAL_COMMAND_RE = re.compile(r'(\w+)\((.*?)\)')
+# A bare number Python would accept as-is (no leading zeros on integers)
+_NUMBER_LITERAL_RE = re.compile(r'-?(?:0|[1-9][0-9]*)(\.[0-9]*)?')
+
+# Patterns used by the editor's current-line highlighting and hover tooltips
+_OPERATOR_RE = re.compile(r'[-+*/^]')
+_PAREN_CHAR_RE = re.compile(r'[()]')
+_COMMENT_LINE_RE = re.compile(r'\s*:::')
+
+def is_comment_line(text):
+    """True for ':::' comment lines, ignoring leading whitespace (without copying the line)"""
+    return _COMMENT_LINE_RE.match(text) is not None
+_LINE_LN_REF_RE = re.compile(r'\b(?:s\.(.*?)\.)?ln(\d+)\b', re.IGNORECASE)
+_HOVER_SHEET_REF_RE = re.compile(r'\b(?:s|S)\.(.+?)\.(?:ln|LN)(\d+)\b')
+_HOVER_LN_REF_RE = re.compile(r'\bLN(\d+)\b')
+
 
 def parse_date(date_str):
     """Parse a date string in various formats"""
     date_str = date_str.strip()
     
     # First try to parse continuous number format (MMDDYYYY or MDYYYY)
-    num_only = re.sub(r'[^\d]', '', date_str)
+    num_only = date_str if date_str.isdecimal() else _NON_DIGIT_RE.sub('', date_str)
     if len(num_only) in (6, 7, 8):
         try:
-            # Handle different length formats
-            if len(num_only) == 8:  # MMDDYYYY
-                month = int(num_only[:2])
-                day = int(num_only[2:4])
-                year = int(num_only[4:])
-            elif len(num_only) == 7:  # MDDYYYY
-                month = int(num_only[0])
-                day = int(num_only[1:3])
-                year = int(num_only[3:])
-            else:  # MDYYYY
-                month = int(num_only[0])
-                day = int(num_only[1])
-                year = int(num_only[2:])
+            # Split the fields arithmetically: the year is always the last four
+            # digits, the day is two digits for MMDDYYYY/MDDYYYY and one for MDYYYY
+            month_day, year = divmod(int(num_only), 10000)
+            month, day = divmod(month_day, 10 if len(num_only) == 6 else 100)
             
             # Validate month and day
             if 1 <= month <= 12 and 1 <= day <= 31:
@@ -56,73 +145,85 @@ def parse_date(date_str):
         except ValueError:
             pass
     
-    # If continuous format fails, try standard formats
-    formats = [
-        # Month name formats (try these first)
-        '%B %d, %Y',  # "July 12, 1985"
-        '%B %d,%Y',   # "July 12,1985"
-        '%b %d, %Y',  # "Jul 12, 1985"
-        '%b %d,%Y',   # "Jul 12,1985"
-        # Numeric formats with different separators
-        '%m/%d/%Y',   # "07/12/1985"
-        '%m.%d.%Y',   # "07.12.1985"
-        '%-m/%-d/%Y', # "7/12/1985"
-        '%-m.%-d.%Y'  # "7.12.1985"
-    ]
-    
-    for fmt in formats:
-        try:
-            return datetime.strptime(date_str, fmt).date()
-        except ValueError:
-            continue
+    # If continuous format fails, pick the one format the string can match
+    # from its shape instead of trying each format in turn
+    if date_str[:1].isalpha():
+        # Month name formats: "July 12, 1985", "July 12,1985", "Jul 12, 1985", "Jul 12,1985"
+        match = _MONTH_NAME_DATE_RE.fullmatch(date_str)
+        if match:
+            month_word, day, year = match.groups()
+            months = _MONTH_ABBREVIATIONS if len(month_word) <= 3 else _MONTH_NAMES
+            month = months.get(month_word.lower())
+            if month:
+                try:
+                    return datetime(int(year), month, int(day)).date()
+                except ValueError:
+                    pass
+    else:
+        # Numeric formats with different separators: "07/12/1985", "7.12.1985"
+        parts = date_str.split('/' if '/' in date_str else '.')
+        if (len(parts) == 3 and all(part.isdecimal() for part in parts)
+                and len(parts[0]) <= 2 and len(parts[1]) <= 2 and len(parts[2]) == 4):
+            try:
+                return datetime(int(parts[2]), int(parts[0]), int(parts[1])).date()
+            except ValueError:
+                pass
             
     raise ValueError(f"Could not parse date: {date_str}")
 
+def _business_day_offsets(direction):
+    """Calendar offsets of the 1st..5th business day from each weekday, stepping in direction"""
+    table = []
+    for weekday in range(7):
+        offsets = []
+        offset = 0
+        for _ in range(5):
+            offset += direction
+            # Skip weekends (5 = Saturday, 6 = Sunday)
+            while (weekday + offset) % 7 >= 5:
+                offset += direction
+            offsets.append(offset)
+        table.append(tuple(offsets))
+    return tuple(table)
+
+# direction -> weekday -> calendar offset of the (n+1)th business day
+_BDAY_OFFSETS = {1: _business_day_offsets(1), -1: _business_day_offsets(-1)}
+
 def add_business_days(start_date, days):
     """Add business days to a date, skipping weekends"""
-    current_date = start_date
-    remaining_days = abs(days)
+    if days == 0:
+        return start_date
     direction = 1 if days > 0 else -1
     
-    while remaining_days > 0:
-        current_date += timedelta(days=direction)
-        # Skip weekends (5 = Saturday, 6 = Sunday)
-        if current_date.weekday() < 5:
-            remaining_days -= 1
-            
-    return current_date
+    # Landing on a business day, every further five business days is exactly
+    # one calendar week, so only the first partial week needs the table
+    weeks, remainder = divmod(abs(days) - 1, 5)
+    offset = _BDAY_OFFSETS[direction][start_date.weekday()][remainder]
+    return start_date + timedelta(days=offset + direction * 7 * weeks)
+
+# weekday -> number of days n (0-6) -> business days among n consecutive days
+# starting on that weekday
+_PARTIAL_BDAYS = tuple(
+    tuple(sum((weekday + offset) % 7 < 5 for offset in range(n)) for n in range(7))
+    for weekday in range(7)
+)
 
 def count_business_days(start_date, end_date):
     """Count business days between two dates, excluding weekends"""
     if start_date > end_date:
         start_date, end_date = end_date, start_date
         
-    business_days = 0
-    current_date = start_date
-    
-    while current_date <= end_date:
-        if current_date.weekday() < 5:  # Monday = 0, Sunday = 6
-            business_days += 1
-        current_date += timedelta(days=1)
-        
-    return business_days
+    # Every whole week contributes five business days; the leftover days
+    # (fewer than seven) start on the same weekday as start_date
+    full_weeks, remainder = divmod((end_date - start_date).days + 1, 7)
+    return full_weeks * 5 + _PARTIAL_BDAYS[start_date.weekday()][remainder]
 
 def handle_date_arithmetic(expr):
     """Handle date arithmetic expressions inside D() functions"""
-    # Define date patterns without D. prefixes
-    date_patterns = [
-        # Two dates with subtraction - handle spaces in dates and W- syntax
-        r'([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)\s*W\s*-\s*([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)',  # Date range with W-
-        r'([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)\s*-\s*([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)',       # Date range without W
-        # Date plus/minus days - handle spaces and optional W
-        r'([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)\s*W\s*([+\-])\s*(\d+)',  # With W
-        r'([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)\s*([+\-])\s*(\d+)',      # Without W
-        # Single date
-        r'^([A-Za-z]+\s+\d+,\s*\d{4}|\d[\d.]*)$'
-    ]
-    
-    for pattern in date_patterns:
-        match = re.match(pattern, expr.strip())
+    has_w = 'W' in expr
+    text = expr.strip()
+    for pattern in _DATE_PATTERN_TIERS[has_w, '-' in expr, '+' in expr]:
+        match = pattern.match(text)
         if match:
             groups = match.groups()
             
@@ -131,7 +232,7 @@ def handle_date_arithmetic(expr):
                     date1 = parse_date(groups[0].strip())
                     date2 = parse_date(groups[1].strip())
                     # Check if there's a W before the minus sign
-                    if 'W-' in expr or 'W -' in expr:
+                    if has_w and ('W-' in expr or 'W -' in expr):
                         days = count_business_days(date1, date2)
                         return {'value': days, 'unit': 'Business Days'}
                     else:
@@ -147,7 +248,7 @@ def handle_date_arithmetic(expr):
                     days = int(groups[2])
                     
                     # Check if this is a business day calculation
-                    if 'W' in expr:
+                    if has_w:
                         if op == '+':
                             result = add_business_days(date, days)
                         else:
@@ -194,6 +295,25 @@ def parse_timecode(tc_str):
     except ValueError:
         raise TimecodeError(f"Invalid number in timecode: {tc_str}")
 
+@lru_cache(maxsize=64)
+def _fps_profile(fps):
+    """Return (base fps, frames dropped per minute, exact rate) for a frame rate"""
+    if abs(fps - 29.97) < 0.01:
+        return 30, 2, None
+    if abs(fps - 59.94) < 0.01:
+        return 60, 4, None
+    if abs(fps - 23.976) < 0.01:
+        # Exact NTSC frame rate, non-drop
+        return 24, 0, 24000 / 1001
+    return None, 0, None
+
+# Drop-frame base rate -> frames in one hour, one ten-minute block and one
+# dropping minute (SMPTE 12M: 2 or 4 frames dropped each minute but every 10th)
+_DROP_FRAME_COUNTS = {
+    30: (107892, 17982, 1798),
+    60: (215784, 35964, 3596),
+}
+
 def timecode_to_frames(tc_str, fps):
     """Convert a timecode string to total frames"""
     if isinstance(tc_str, (int, float)):
@@ -206,79 +326,51 @@ def timecode_to_frames(tc_str, fps):
     if frames >= max_frames:
         raise TimecodeError(f"Frame count {frames} exceeds maximum for {fps} fps (max: {max_frames-1})")
     
-    if abs(fps - 29.97) < 0.01:
-        # For 29.97 fps drop frame:
-        # Calculate total frames using the standard drop frame formula
-        total_minutes = (60 * hours) + minutes
-        
-        # Calculate base frames (as if 30fps)
-        total_frames = (hours * 3600 * 30) + (minutes * 60 * 30) + (seconds * 30) + frames
-        
-        # Subtract dropped frames: 2 frames dropped every minute except every 10th minute
-        drops = 2 * (total_minutes - total_minutes // 10)
-        
-        result = total_frames - drops
-        return result
-        
-    elif abs(fps - 59.94) < 0.01:
-        # For 59.94 fps drop frame
-        total_minutes = (60 * hours) + minutes
-        
-        # Calculate base frames (as if 60fps)
-        total_frames = (hours * 3600 * 60) + (minutes * 60 * 60) + (seconds * 60) + frames
-        
-        # Subtract dropped frames: 4 frames dropped every minute except every 10th minute
-        drops = 4 * (total_minutes - total_minutes // 10)
-        
-        result = total_frames - drops
-        return result
-        
-    elif abs(fps - 23.976) < 0.01:
+    base_fps, drop_per_minute, exact_fps = _fps_profile(fps)
+    
+    if drop_per_minute:
+        # 29.97/59.94 drop frame: whole hours, ten-minute blocks and minutes
+        # each hold a fixed number of frames once the drops are taken out
+        per_hour, per_ten_minutes, per_minute = _DROP_FRAME_COUNTS[base_fps]
+        tens, ones = divmod(minutes, 10)
+        return (hours * per_hour + tens * per_ten_minutes + ones * per_minute
+                + seconds * base_fps + frames)
+    
+    total_seconds = hours * 3600 + minutes * 60 + seconds
+    if exact_fps:
         # For 23.976, use exact NTSC frame rate
-        exact_fps = 24000 / 1001
-        total_seconds = hours * 3600 + minutes * 60 + seconds
-        result = int(round(total_seconds * exact_fps)) + frames
-        return result
+        return int(round(total_seconds * exact_fps)) + frames
     else:
         # Non-drop frame rates - simple calculation
-        total_seconds = hours * 3600 + minutes * 60 + seconds
-        result = int(total_seconds * fps) + frames
-        return result
+        return int(total_seconds * fps) + frames
+
+# Zero-padded strings for timecode fields, so formatting is a tuple lookup
+_TWO_DIGITS = tuple(f"{i:02d}" for i in range(100))
 
 def frames_to_timecode(frame_count, fps):
     """Convert frame count to timecode string"""
+    # Zero and sub-second counts are only a frames field, at every frame rate
+    if type(frame_count) is int and 0 <= frame_count < min(int(round(fps)), 100):
+        return "00:00:00:" + _TWO_DIGITS[frame_count]
+    
     if frame_count < 0:
         sign = "-"
         frame_count = abs(frame_count)
     else:
         sign = ""
     
-    if abs(fps - 29.97) < 0.01:
-        # For 29.97 drop frame, first calculate total minutes
-        total_minutes = frame_count // (30 * 60)  # Using 30 fps as base
-        
-        # Calculate the number of drop frames
-        drops = 2 * (total_minutes - total_minutes // 10)
+    base_fps, drop_per_minute, exact_fps = _fps_profile(fps)
+    
+    if drop_per_minute:
+        # For 29.97/59.94 drop frame, first calculate total minutes at the base rate
+        total_minutes = frame_count // (base_fps * 60)
         
         # Add back the dropped frames to get real frame count
-        real_frames = frame_count + drops
+        real_frames = frame_count + drop_per_minute * (total_minutes - total_minutes // 10)
         
         # Now calculate the time components
-        frames = real_frames % 30
-        total_seconds = real_frames // 30
-        seconds = total_seconds % 60
-        total_minutes = total_seconds // 60
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        
-    elif abs(fps - 59.94) < 0.01:
-        # Similar logic for 59.94
-        total_minutes = frame_count // (60 * 60)
-        drops = 4 * (total_minutes - total_minutes // 10)
-        real_frames = frame_count + drops
-        
-        frames = real_frames % 60
-        total_seconds = real_frames // 60
+        frames = real_frames % base_fps
+        total_seconds = real_frames // base_fps
         seconds = total_seconds % 60
         total_minutes = total_seconds // 60
         hours = total_minutes // 60
@@ -286,8 +378,7 @@ def frames_to_timecode(frame_count, fps):
         
     else:
         # Non-drop frame rates
-        if abs(fps - 23.976) < 0.01:
-            exact_fps = 24000 / 1001
+        if exact_fps:
             total_seconds = frame_count / exact_fps
         else:
             total_seconds = frame_count / fps
@@ -308,7 +399,11 @@ def frames_to_timecode(frame_count, fps):
                     minutes = 0
                     hours += 1
     
-    return f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}:{frames:02d}"
+    # Minutes and seconds are always below 60; hours and frames (above 99 fps) may not be
+    return (sign
+            + (_TWO_DIGITS[hours] if hours < 100 else str(hours)) + ':'
+            + _TWO_DIGITS[minutes] + ':' + _TWO_DIGITS[seconds] + ':'
+            + (_TWO_DIGITS[frames] if frames < 100 else str(frames)))
 
 def evaluate_timecode_expr(fps, expr):
     """Evaluate a timecode expression"""
@@ -319,27 +414,18 @@ def evaluate_timecode_expr(fps, expr):
     # Normalize all timecode separators to colons
     expr = expr.replace('.', ':')
     
-    # Find all timecodes and operators in the expression
-    tc_pattern = r'\d{1,2}[:\.]\d{2}[:\.]\d{2}[:\.]\d{2}'
-    
-    # First, standardize the expression by adding spaces around operators
-    expr = re.sub(r'([+\-*/])', r' \1 ', expr.strip())
-    
-    # Split the expression into tokens
-    tokens = expr.split()
-    
-    # Process each token
+    # Process each token: single operator characters, or runs between operators/whitespace
     result = None
     current_op = '+'
     
-    for token in tokens:
+    for token in _TC_TOKEN_RE.findall(expr):
         if token in '+-*/':
             current_op = token
             continue
             
         try:
             # Try to convert token to frames
-            if re.match(r'^\d{1,2}[:\.]\d{1,2}[:\.]\d{1,2}[:\.]\d{1,2}$', token):
+            if ':' in token and _TIMECODE_RE.match(token):
                 frames = timecode_to_frames(token, fps)
             else:
                 # If not a timecode, evaluate as a number
@@ -371,13 +457,22 @@ def TC(fps, *args):
         raise TimecodeError("TC function requires at least two arguments: framerate and timecode/frames")
     
     # Join all arguments to handle expressions with spaces
-    expr = ' '.join(str(arg) for arg in args)
+    if len(args) == 1:
+        expr = args[0]
+    else:
+        expr = ' '.join(str(arg) for arg in args)
     
     try:
         fps = float(fps)
         if fps <= 0:
             raise TimecodeError("Framerate must be positive")
         
+        # A plain frame count such as TC(24, 100) needs no string handling
+        if type(expr) is int and expr >= 0:
+            return frames_to_timecode(expr, fps)
+        if not isinstance(expr, str):
+            expr = str(expr)
+        
         # Clean up the expression
         expr = expr.strip()
         
@@ -387,7 +482,7 @@ def TC(fps, *args):
             
         # If it's a single timecode without arithmetic, normalize separators and return frames
         # Handle both : and . as separators, and allow optional leading 0 in hours
-        if re.match(r'^\d{1,2}[:\.]\d{1,2}[:\.]\d{1,2}[:\.]\d{1,2}$', expr):
+        if _TIMECODE_RE.match(expr):
             # Normalize to use colons
             expr = expr.replace('.', ':')
             frames = timecode_to_frames(expr, fps)
@@ -406,7 +501,7 @@ def AR(original, target):
         target_str = str(target).strip()
         
         # Parse original dimensions (e.g., "1920x1080")
-        original_match = re.match(r'(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)', original_str, re.IGNORECASE)
+        original_match = _AR_ORIGINAL_RE.match(original_str)
         if not original_match:
             raise ValueError(f"Invalid original dimensions format: {original_str}")
         
@@ -415,7 +510,7 @@ def AR(original, target):
         aspect_ratio = orig_width / orig_height
         
         # Parse target dimensions (e.g., "?x2000" or "1280x?")
-        target_match = re.match(r'(\?|\d+(?:\.\d+)?)x(\?|\d+(?:\.\d+)?)', target_str, re.IGNORECASE)
+        target_match = _AR_TARGET_RE.match(target_str)
         if not target_match:
             raise ValueError(f"Invalid target dimensions format: {target_str}")
         
@@ -449,7 +544,7 @@ def truncate(value, decimals=2):
     if isinstance(value, str):
         # If it's a string expression, evaluate it first
         try:
-            value = eval(value, {"truncate": truncate, "TR": truncate, **GLOBALS}, {})
+            value = eval_expression(value, GLOBALS)
         except:
             return value
     if isinstance(value, dict) and 'value' in value:
@@ -472,6 +567,88 @@ def truncate(value, decimals=2):
 # Add TC function and math functions to evaluation namespace
 GLOBALS = {"TC": TC, "AR": AR, "truncate": truncate, "TR": truncate, **MATH_FUNCS}
 
+# Namespace for worksheet lines, built once instead of for every evaluated line
+EVAL_GLOBALS = {**GLOBALS, "mean": statistics.mean}
+
+@lru_cache(maxsize=4096)
+def _compile_or_error(expr):
+    """Return the code object for expr, or the (class, args) of the error compiling it raised"""
+    try:
+        # eval() on a string ignores surrounding spaces and tabs; compile() does not
+        return compile(expr.strip(' \t'), '<calc>', 'eval')
+    except (SyntaxError, ValueError) as e:
+        # Keep only plain data: a cached exception instance would pick up the
+        # traceback (and the frames it references) of every later raise
+        return type(e), e.args
+
+# Node types allowed in the arithmetic that TC() arguments are folded from
+_ARITHMETIC_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub,
+)
+
+@lru_cache(maxsize=1024)
+def compile_arithmetic(expr):
+    """Compile a numbers-and-operators expression, or return None for anything else"""
+    try:
+        tree = ast.parse(expr.strip(' \t'), mode='eval')
+    except (SyntaxError, ValueError):
+        return None
+    for node in ast.walk(tree):
+        if not isinstance(node, _ARITHMETIC_NODES):
+            return None
+        if isinstance(node, ast.Constant) and type(node.value) not in (int, float):
+            return None
+    return compile(tree, '<calc>', 'eval')
+
+def compile_expression(expr):
+    """Compile an expression for eval(), caching the code object by its source text.
+    
+    Malformed input (typically a line still being typed) is cached too, so
+    re-evaluating it raises a fresh copy of the stored error without running
+    the compiler again.
+    """
+    code = _compile_or_error(expr)
+    if isinstance(code, tuple):
+        error_class, error_args = code
+        raise error_class(*error_args) from None
+    return code
+
+def eval_expression(expr, namespace=EVAL_GLOBALS):
+    """Evaluate an expression, skipping the compiler for plain number literals"""
+    literal = _NUMBER_LITERAL_RE.fullmatch(expr.strip(' \t'))
+    if literal:
+        return float(literal.group()) if literal.group(1) else int(literal.group())
+    return eval(compile_expression(expr), namespace, {})
+
+@lru_cache(maxsize=1024)
+def evaluate_subexpression(expr):
+    """Evaluate a reference-free sub-expression for the operator tooltips.
+    
+    Returns the result with float noise rounded away, or None if it cannot be
+    evaluated. The value depends only on the text, so hovering back and forth
+    over the same operator reuses it.
+    """
+    try:
+        result = eval_expression(expr, GLOBALS)
+    except Exception:
+        return None
+    
+    # Integer results (the common case) need no normalization
+    if type(result) is int:
+        return result
+    
+    # Format the result nicely
+    if isinstance(result, float):
+        # Round to 6 decimal places to avoid floating point noise
+        result = round(result, 6)
+        # Convert to int if it's a whole number
+        if result.is_integer():
+            result = int(result)
+    
+    return result
+
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPlainTextEdit,
     QTextEdit, QSplitter, QPushButton, QMessageBox, QTabWidget, QInputDialog,
@@ -490,82 +667,232 @@ from PySide6.QtCore import (
 # Update the unit abbreviation mapping
 # All constants moved to constants.py module
 
+# Syntax highlighting patterns, compiled once at import instead of on every
+# highlightBlock() call. QRegularExpression is kept (rather than re) so match
+# offsets stay in the UTF-16 units that setFormat() expects.
+# All highlightable tokens fused into one pattern so each block is scanned once.
+# Alternatives are tried left to right at each position, so sheet references
+# win over the plain LN/number tokens they contain. Any identifier followed by
+# "(" is captured as a call; whether it is a known function is a set lookup
+# rather than a 40-way alternation inside the regex.
+_TOKEN_RE = QRegularExpression(
+    r"(?P<sheet>(?i:\bs\.(?P<sheetname>.*?)\.ln(?P<sheetln>\d+)\b))"
+    r"|(?P<ln>(?i:\bln(?P<lnnum>\d+)\b))"
+    r"|(?P<num>\b\d+(?:\.\d+)?\b)"
+    r"|(?P<op>\bto\b|[+\-*/%^=])"
+    r"|(?P<func>\b[A-Za-z_]\w*\b)(?=\s*\()"
+)
+_FUNCTION_NAME_SET = frozenset(name.lower() for name in FUNCTION_NAMES)
+# Parentheses are located by the regex engine so the matching loop only
+# visits the brackets themselves, not every character of the line.
+_PAREN_RE = QRegularExpression(r"[()]")
+
+# Have PCRE2 JIT-compile the highlight patterns now rather than on their first
+# use, so the first keystroke doesn't pay for it.
+_TOKEN_RE.optimize()
+_PAREN_RE.optimize()
+
+@lru_cache(maxsize=4096)
+def scan_highlight_tokens(text):
+    """Tokenize one formula line for highlighting.
+
+    Returns (spans, sheet_refs, ln_refs): spans are (start, length, format_key)
+    in the order they must be applied, sheet_refs are
+    (start, length, ln_number, name_start, name_length) and ln_refs are
+    (start, length, ln_number). The result depends only on the text, so it is
+    cached - most blocks are rehighlighted with unchanged content.
+    """
+    spans = []
+    sheet_refs = []
+    ln_refs = []
+
+    # Parentheses first: only sheet references can overlap them, and those must win.
+    # A ')' is only ever formatted when it closes a '(', so lines without an
+    # opening parenthesis skip the scan entirely.
+    if '(' in text:
+        stack = []
+        positions = []
+        marks = {}  # position -> 'paren' / 'unmatched'; unmatched ')' is left unformatted
+        it = _PAREN_RE.globalMatch(text)
+        while it.hasNext():
+            m = it.next()
+            i = m.capturedStart()
+            positions.append(i)
+            if m.captured() == '(':
+                stack.append(i)
+            elif stack:
+                marks[stack.pop()] = marks[i] = 'paren'
+        for pos in stack:
+            marks[pos] = 'unmatched'
+        # Positions come out of the scan in order, so runs such as '((' or '))'
+        # with the same format are merged into one span
+        run_start = run_end = run_key = None
+        for pos in positions:
+            key = marks.get(pos)
+            if key is None:
+                continue
+            if key == run_key and pos == run_end:
+                run_end += 1
+                continue
+            if run_key is not None:
+                spans.append((run_start, run_end - run_start, run_key))
+            run_start, run_end, run_key = pos, pos + 1, key
+        if run_key is not None:
+            spans.append((run_start, run_end - run_start, run_key))
+
+    it = _TOKEN_RE.globalMatch(text)
+    while it.hasNext():
+        m = it.next()
+        if m.capturedStart('sheet') >= 0:
+            sheet_refs.append((m.capturedStart(), m.capturedLength(), int(m.captured('sheetln')),
+                               m.capturedStart() + 2, m.capturedLength('sheetname')))
+        elif m.capturedStart('ln') >= 0:
+            ln_refs.append((m.capturedStart(), m.capturedLength(), int(m.captured('lnnum'))))
+        elif m.capturedStart('num') >= 0:
+            spans.append((m.capturedStart(), m.capturedLength(), 'number'))
+        elif m.capturedStart('op') >= 0:
+            spans.append((m.capturedStart(), m.capturedLength(), 'operator'))
+        elif m.captured('func').lower() in _FUNCTION_NAME_SET:
+            spans.append((m.capturedStart(), m.capturedLength(), 'function'))
+
+    return tuple(spans), tuple(sheet_refs), tuple(ln_refs)
+
+@lru_cache(maxsize=512)
+def unit_conversion_factor(from_unit, to_unit):
+    """Return the multiplier from one unit to another, or None for offset units like degC"""
+    if ureg.Quantity(0.0, from_unit).to(to_unit).magnitude != 0:
+        return None
+    return ureg.Quantity(1.0, from_unit).to(to_unit).magnitude
+
+# (FROM, TO) -> (expiry time, rate); avoids one HTTP round trip per currency line
+_exchange_rate_cache = {}
+_exchange_rate_api_retry_at = 0.0  # monotonic time before which the API is not tried again
+_http_session = None
+
+def get_http_session():
+    """Return a shared requests session so rate lookups reuse the connection"""
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        _http_session.headers['User-Agent'] = 'CalcForge'
+    return _http_session
+
 def get_exchange_rate(from_currency, to_currency):
     """Get exchange rate between two currencies"""
+    global _exchange_rate_api_retry_at
     if from_currency == to_currency:
         return 1.0
     
-    # Try to get real-time rates first
-    if CURRENCY_API_AVAILABLE:
+    key = (from_currency.upper(), to_currency.upper())
+    cached = _exchange_rate_cache.get(key)
+    now = time.monotonic()
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    
+    # Try to get real-time rates first, unless the API just failed: each
+    # attempt can block for the full timeout, so other pairs skip it for a while
+    if CURRENCY_API_AVAILABLE and now >= _exchange_rate_api_retry_at:
         try:
             # Using a free API - exchangerate.host
-            url = f"https://api.exchangerate.host/latest?base={from_currency.upper()}&symbols={to_currency.upper()}"
-            response = requests.get(url, timeout=3)
+            url = f"https://api.exchangerate.host/latest?base={key[0]}&symbols={key[1]}"
+            response = get_http_session().get(url, timeout=3)
             if response.status_code == 200:
                 data = response.json()
-                if 'rates' in data and to_currency.upper() in data['rates']:
-                    return data['rates'][to_currency.upper()]
+                if 'rates' in data and key[1] in data['rates']:
+                    rate = data['rates'][key[1]]
+                    _exchange_rate_cache[key] = (now + EXCHANGE_RATE_TTL, rate)
+                    return rate
+            else:
+                _exchange_rate_api_retry_at = now + EXCHANGE_RATE_RETRY_TTL
         except Exception as e:
-            pass
+            _exchange_rate_api_retry_at = now + EXCHANGE_RATE_RETRY_TTL
     
     # Fall back to static rates
     from_rate = FALLBACK_RATES.get(from_currency.lower(), None)
     to_rate = FALLBACK_RATES.get(to_currency.lower(), None)
     
+    # Fallback and unknown results are kept briefly so the API is retried soon
     if from_rate is None or to_rate is None:
-        return None
+        rate = None
+    else:
+        # Convert via USD
+        rate = to_rate / from_rate
+    _exchange_rate_cache[key] = (now + EXCHANGE_RATE_RETRY_TTL, rate)
+    return rate
+
+def convert_currency(value, from_currency, to_currency):
+    """Convert an already-parsed currency expression (value and names as matched)"""
+    # Clean up currency names and get abbreviations
+    from_currency = from_currency.lower().strip()
+    to_currency = to_currency.lower().strip()
     
-    # Convert via USD
-    return to_rate / from_rate
-
-def handle_currency_conversion(expr):
-    """Handle currency conversion expressions like '20.40 dollars to euros'"""
-    # Pattern to match currency conversions
-    pattern = r'^([\d.]+)\s+(.+?)\s+to\s+(.+?)$'
-    match = re.match(pattern, expr.strip(), re.IGNORECASE)
+    # Convert to standard abbreviations
+    from_abbr = CURRENCY_ABBR.get(from_currency)
+    to_abbr = CURRENCY_ABBR.get(to_currency)
     
-    if match:
-        value, from_currency, to_currency = match.groups()
-        
-        # Clean up currency names and get abbreviations
-        from_currency = from_currency.lower().strip()
-        to_currency = to_currency.lower().strip()
-        
-        # Convert to standard abbreviations
-        from_abbr = CURRENCY_ABBR.get(from_currency)
-        to_abbr = CURRENCY_ABBR.get(to_currency)
-        
-        if from_abbr and to_abbr:
-            try:
-                value = float(value)
-                rate = get_exchange_rate(from_abbr, to_abbr)
-                
-                if rate is not None:
-                    result = value * rate
-                    # Get display name for the target currency
-                    display_currency = CURRENCY_DISPLAY.get(to_abbr, to_currency)
-                    return {'value': result, 'unit': display_currency}
-            except (ValueError, TypeError):
-                pass
+    if from_abbr and to_abbr:
+        try:
+            value = float(value)
+            rate = get_exchange_rate(from_abbr, to_abbr)
+            
+            if rate is not None:
+                result = value * rate
+                # Get display name for the target currency
+                display_currency = CURRENCY_DISPLAY.get(to_abbr, to_currency)
+                return {'value': result, 'unit': display_currency}
+        except (ValueError, TypeError):
+            pass
     
     return None
 
+# Currency names in sorted order, so the names sharing a prefix are one contiguous run
+_CURRENCY_NAMES = tuple(sorted(CURRENCY_ABBR))
+
+def currency_names_with_prefix(prefix):
+    """Return the currency names starting with prefix, in sorted order"""
+    names = _CURRENCY_NAMES
+    i = bisect_left(names, prefix)
+    matches = []
+    while i < len(names) and names[i].startswith(prefix):
+        matches.append(names[i])
+        i += 1
+    return matches
+
+# Every conversion name tagged with its kind and abbreviation, so one lookup tells a
+# unit from a currency; names in both tables (pound) resolve as units, which win first
+_CONVERSION_NAMES = {name: ('currency', abbr) for name, abbr in CURRENCY_ABBR.items()}
+_CONVERSION_NAMES.update((name, ('unit', abbr)) for name, abbr in UNIT_ABBR.items())
+_UNLISTED_NAME = (None, None)
+
 def remove_thousands_commas(match):
     """Remove thousands separators (commas) from number strings"""
     number_str = match.group(0)
     # Remove all commas from the number
     return number_str.replace(',', '')
 
+@lru_cache(maxsize=256)
+def _quote_positions(text):
+    """Return the positions of the double quotes in text, and of those preceded by a backslash"""
+    quotes = []
+    i = text.find('"')
+    while i >= 0:
+        quotes.append(i)
+        i = text.find('"', i + 1)
+    escaped = [i for i in quotes if i and text[i - 1] == '\\']
+    return quotes, escaped
+
 def repl_num(m):
     """Replace numbers with leading zeros, avoiding timecodes and quoted strings"""
     # Don't replace if it's part of a timecode
-    if re.match(r'\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}', m.string[max(0, m.start()-8):m.end()+8]):
-        return m.group(0)
-    # Don't replace if it's inside quotes
-    before_match = m.string[:m.start()]
-    quote_count_before = before_match.count('"') - before_match.count('\\"')
-    if quote_count_before % 2 == 1:  # We're inside quotes
+    if _TIMECODE_TEXT_RE.match(m.string[max(0, m.start()-8):m.end()+8]):
         return m.group(0)
+    # Don't replace if it's inside quotes: an odd number of unescaped quotes
+    # before it. The positions are found once per expression, not per number.
+    quotes, escaped = _quote_positions(m.string)
+    if quotes:
+        start = m.start()
+        if (bisect_left(quotes, start) - bisect_left(escaped, start)) % 2 == 1:
+            return m.group(0)
     return str(int(m.group(1)))
 
 class LineData(QTextBlockUserData):
@@ -673,10 +1000,9 @@ class ResultsLineNumberArea(LineNumberAreaBase):
             if block_number < editor_doc.blockCount():
                 editor_block = editor_doc.findBlockByNumber(block_number)
                 if editor_block.isValid():
-                    editor_text = editor_block.text().strip()
                     editor_data = editor_block.userData()
                     
-                    if editor_text.startswith(":::"):
+                    if is_comment_line(editor_block.text()):
                         label = "C"
                         color = "#7ED321"
                     elif isinstance(editor_data, LineData):
@@ -692,6 +1018,7 @@ class BaseHighlighter(QSyntaxHighlighter):
     
     def __init__(self, document):
         super().__init__(document)
+        self._darker_colors = {}  # (color, factor) -> QColor
         
     def _fmt(self, color, bold=False, alpha=255):
         """Create a text format with given color and optional bold styling"""
@@ -703,9 +1030,25 @@ class BaseHighlighter(QSyntaxHighlighter):
         
     def get_darker_color(self, color, factor=0.3):
         """Return a darker version of the given color for background highlighting"""
-        c = QColor(color)
-        h, s, v, a = c.getHsv()
-        return QColor.fromHsv(h, s, int(v * factor), a)
+        # LN colors come from a small fixed palette, so convert each one only once
+        darker = self._darker_colors.get((color, factor))
+        if darker is None:
+            h, s, v, a = QColor(color).getHsv()
+            darker = QColor.fromHsv(h, s, int(v * factor), a)
+            self._darker_colors[(color, factor)] = darker
+        return QColor(darker)
+
+class LNPalette(dict):
+    """Map of LN number -> color that assigns the next palette color on first lookup"""
+    
+    def __init__(self, colors):
+        super().__init__()
+        self.colors = colors
+        
+    def __missing__(self, ln_number):
+        color = self.colors[len(self) % len(self.colors)]
+        self[ln_number] = color
+        return color
 
 class FormulaHighlighter(BaseHighlighter):
     """Advanced syntax highlighter for formula input with comprehensive highlighting"""
@@ -725,97 +1068,62 @@ class FormulaHighlighter(BaseHighlighter):
         # Color palette for LN variables - use constants from constants module
         self.ln_colors = LN_COLORS
         
-        # Store persistent LN colors
-        self.persistent_ln_colors = {}
+        # Store persistent LN colors (assigned from the palette on first use)
+        self.persistent_ln_colors = LNPalette(self.ln_colors)
+        
+        # Formats for LN references and sheet names are built once here rather
+        # than allocated for every reference on every highlighted block
+        self.ln_formats = {color: self._fmt(color) for color in self.ln_colors}
+        self.sheet_name_format = self._fmt("#4DA6FF")  # Use operator color for sheet name
         
         # Use function names from constants module
         self.function_names = FUNCTION_NAMES
         
     def get_ln_color(self, ln_number):
         """Get or assign a color for an LN variable"""
-        if ln_number not in self.persistent_ln_colors:
-            # Assign a new color from the palette
-            color_idx = len(self.persistent_ln_colors) % len(self.ln_colors)
-            self.persistent_ln_colors[ln_number] = self.ln_colors[color_idx]
         return self.persistent_ln_colors[ln_number]
         
     def highlightBlock(self, text):
-        if text.strip().startswith(":::"):
+        if is_comment_line(text):
             self.setFormat(0, len(text), self.formats['comment'])
             return
             
         # First reset all formatting
         self.setFormat(0, len(text), QTextCharFormat())
         
-        # Highlight numbers
-        num_re = QRegularExpression(r"\b\d+(?:\.\d+)?\b")
-        it = num_re.globalMatch(text)
-        while it.hasNext():
-            m = it.next()
-            self.setFormat(m.capturedStart(), m.capturedLength(), self.formats['number'])
-            
-        # Highlight operators
-        op_re = QRegularExpression(r"\bto\b|[+\-*/%^=]")
-        it = op_re.globalMatch(text)
-        while it.hasNext():
-            m = it.next()
-            self.setFormat(m.capturedStart(), m.capturedLength(), self.formats['operator'])
-            
-        # Highlight function names
-        for func_name in self.function_names:
-            # Create regex pattern for function name followed by opening parenthesis
-            func_re = QRegularExpression(r"\b" + re.escape(func_name) + r"\b(?=\s*\()", QRegularExpression.CaseInsensitiveOption)
-            it = func_re.globalMatch(text)
-            while it.hasNext():
-                m = it.next()
-                self.setFormat(m.capturedStart(), m.capturedLength(), self.formats['function'])
-            
-        # Highlight parentheses
-        stack = []
-        pairs = []
-        for i, ch in enumerate(text):
-            if ch == '(':
-                stack.append(i)
-            elif ch == ')' and stack:
-                start = stack.pop()
-                pairs.append((start, i))
-        for s, e in pairs:
-            self.setFormat(s, 1, self.formats['paren'])
-            self.setFormat(e, 1, self.formats['paren'])
-        for pos in stack:
-            self.setFormat(pos, 1, self.formats['unmatched'])
+        block = self.currentBlock()
+        if not text or text.isspace():
+            # Blank lines have nothing to tokenize
+            block.setUserData(LineData(block.blockNumber() + 1))
+            return
+        
+        spans, sheet_refs, ln_refs = scan_highlight_tokens(text)
+        
+        set_format = self.setFormat
+        formats = self.formats
+        
+        # Parentheses, numbers, operators and function names
+        for start, length, key in spans:
+            set_format(start, length, formats[key])
             
-        # Highlight cross-sheet references and LN references with unique colors - case insensitive
-        sheet_re = QRegularExpression(r"\bs\.(.*?)\.ln(\d+)\b", QRegularExpression.CaseInsensitiveOption)
-        ln_re = QRegularExpression(r"\bln(\d+)\b", QRegularExpression.CaseInsensitiveOption)
+        ln_palette = self.persistent_ln_colors
+        ln_formats = self.ln_formats
         
-        # First highlight sheet references
-        it = sheet_re.globalMatch(text)
-        while it.hasNext():
-            m = it.next()
-            sheet_name = m.captured(1)
-            ln_num = int(m.captured(2))
-            color = self.get_ln_color(ln_num)
-            fmt = self._fmt(color)
-            # Highlight the entire reference
-            self.setFormat(m.capturedStart(), m.capturedLength(), fmt)
-            # Add special formatting for sheet name
-            sheet_fmt = self._fmt("#4DA6FF")  # Use operator color for sheet name
-            sheet_start = m.capturedStart() + 2  # Skip "s."
-            sheet_len = len(sheet_name)
-            self.setFormat(sheet_start, sheet_len, sheet_fmt)
-            
-        # Then highlight regular LN references
-        it = ln_re.globalMatch(text)
-        while it.hasNext():
-            m = it.next()
-            ln_num = int(m.captured(1))
-            color = self.get_ln_color(ln_num)
-            fmt = self._fmt(color)
-            self.setFormat(m.capturedStart(), m.capturedLength(), fmt)
+        # Highlight cross-sheet references and LN references with unique colors.
+        # Sheet references are resolved before plain LN references so new LN
+        # numbers pick up palette colors in the same order as before.
+        if sheet_refs:
+            sheet_name_format = self.sheet_name_format
+            for start, length, ln_num, name_start, name_len in sheet_refs:
+                # Highlight the entire reference
+                set_format(start, length, ln_formats[ln_palette[ln_num]])
+                # Add special formatting for sheet name
+                set_format(name_start, name_len, sheet_name_format)
+            
+        for start, length, ln_num in ln_refs:
+            set_format(start, length, ln_formats[ln_palette[ln_num]])
             
         # Store the block data
-        block = self.currentBlock()
         block.setUserData(LineData(block.blockNumber() + 1))
 
 class ResultsHighlighter(BaseHighlighter):
@@ -1100,12 +1408,6 @@ class KeyEventFilter(QObject):
             alt = event.modifiers() & Qt.AltModifier
             k = event.key()
 
-            # Debug: Log all key events to see what's being filtered
-            if k in (Qt.Key_Delete, Qt.Key_Backspace) or (ctrl and k == Qt.Key_A):
-                cursor = self.editor.textCursor()
-                has_selection = cursor.hasSelection()
-                print(f"DEBUG: KeyEventFilter - Key: {k}, Modifiers: {event.modifiers()}, Has selection: {has_selection}")
-
             # Check if we have a selection when Ctrl key events come in
             cursor = self.editor.textCursor()
             has_selection = cursor.hasSelection()
@@ -1379,11 +1681,8 @@ class EditorAutoCompletionMixin:
         if match:
             # We're completing the target currency
             partial_currency = match.group(3).lower()
-            # Get all currency names that start with the partial input
-            for currency_name in CURRENCY_ABBR.keys():
-                if currency_name.startswith(partial_currency):
-                    completions.append(currency_name)
-            return sorted(completions)
+            # Get all currency names that start with the partial input (already sorted)
+            return currency_names_with_prefix(partial_currency)
         
         # Check if we're typing a source currency after a number
         # Pattern: number + partial_currency (but not followed by "to")
@@ -1394,10 +1693,8 @@ class EditorAutoCompletionMixin:
             # Check if the partial word could be a currency
             partial_currency = match.group(2).lower()
             # Only suggest currencies if the partial input matches currency names
-            currency_matches = []
-            for currency_name in CURRENCY_ABBR.keys():
-                if currency_name.startswith(partial_currency):
-                    currency_matches.append(currency_name + " to ")
+            currency_matches = [currency_name + " to "
+                                for currency_name in currency_names_with_prefix(partial_currency)]
             
             if currency_matches:
                 return sorted(currency_matches)
@@ -1419,6 +1716,12 @@ class EditorAutoCompletionMixin:
         completion_text = item.text()
         cursor = self.textCursor()
         
+        # Function names get parentheses and keep the list open for parameter
+        # completion; constants and currency completions (ending in " to ") don't
+        is_function = (completion_text in self.base_completions and
+                       completion_text not in ('pi', 'e') and
+                       not completion_text.endswith(' to '))
+        
         # Get current line context
         line_text = cursor.block().text()
         cursor_pos = cursor.positionInBlock()
@@ -1481,11 +1784,6 @@ class EditorAutoCompletionMixin:
                 cursor.select(QTextCursor.WordUnderCursor)
                 cursor.removeSelectedText()
                 
-                # Check if this is a function name that needs parentheses
-                is_function = (completion_text in self.base_completions and 
-                             completion_text not in ['pi', 'e'] and  # Constants don't need parentheses
-                             not completion_text.endswith(' to '))  # Currency completions
-                
                 if is_function:
                     # Add parentheses and position cursor inside
                     cursor.insertText(completion_text + '(')
@@ -1497,9 +1795,7 @@ class EditorAutoCompletionMixin:
         self.setTextCursor(cursor)
         
         # Only hide completion list if we're not expecting parameter completion
-        if not (completion_text in self.base_completions and 
-               completion_text not in ['pi', 'e'] and 
-               not completion_text.endswith(' to ')):
+        if not is_function:
             self.completion_list.hide()
 
     def show_completion_popup(self):
@@ -1655,24 +1951,25 @@ class EditorCrossSheetMixin:
             return None
             
         # Find the sheet by name (case insensitive)
-        for i in range(calculator.tabs.count()):
-            if calculator.tabs.tabText(i).lower() == sheet_name.lower():
-                sheet = calculator.tabs.widget(i)
-                if hasattr(sheet, 'editor'):
-                    # First try to find the line by its ID
-                    if ln_number in sheet.editor.ln_value_map:
-                        return sheet.editor.ln_value_map[ln_number]
-                    
-                    # If not found by ID, try to find by line number
-                    doc = sheet.editor.document()
-                    if ln_number <= doc.blockCount():
-                        block = doc.findBlockByNumber(ln_number - 1)  # Convert to 0-based index
-                        if block.isValid():
-                            user_data = block.userData()
-                            if isinstance(user_data, LineData):
-                                line_id = user_data.id
-                                if line_id in sheet.editor.ln_value_map:
-                                    return sheet.editor.ln_value_map[line_id]
+        i = calculator.find_sheet_index(sheet_name)
+        if i < 0:
+            return None
+        sheet = calculator.tabs.widget(i)
+        if hasattr(sheet, 'editor'):
+            # First try to find the line by its ID
+            if ln_number in sheet.editor.ln_value_map:
+                return sheet.editor.ln_value_map[ln_number]
+
+            # If not found by ID, try to find by line number
+            doc = sheet.editor.document()
+            if ln_number <= doc.blockCount():
+                block = doc.findBlockByNumber(ln_number - 1)  # Convert to 0-based index
+                if block.isValid():
+                    user_data = block.userData()
+                    if isinstance(user_data, LineData):
+                        line_id = user_data.id
+                        if line_id in sheet.editor.ln_value_map:
+                            return sheet.editor.ln_value_map[line_id]
         return None
 
     def get_numeric_value(self, value):
@@ -1683,17 +1980,22 @@ class EditorCrossSheetMixin:
             return value['value']
         if isinstance(value, str):
             # Try to extract first number from string
-            match = re.match(r'[-+]?\d*\.?\d+', value)
+            match = _LEADING_NUMBER_RE.match(value)
             if match:
                 return float(match.group())
         return value
 
     def process_ln_refs(self, expr):
         """Replace LN references and cross-sheet references with their values - Stage 2 Optimized"""
-        # Stage 2 Optimization: Check cache first
-        expr_hash = hash(expr)
-        if expr_hash in self._ln_reference_cache:
-            return self._ln_reference_cache[expr_hash]
+        # Every reference form contains 'ln' in some case; anything else is returned unchanged
+        if 'ln' not in expr.lower():
+            return expr
+        
+        # Stage 2 Optimization: Check cache first (keyed by the expression text itself,
+        # so two different expressions can never share an entry)
+        cached = self._ln_reference_cache.get(expr)
+        if cached is not None:
+            return cached
         
         original_expr = expr
         
@@ -1740,7 +2042,7 @@ class EditorCrossSheetMixin:
                     break
         
         # Stage 2 Optimization: Cache the result for future use
-        self._ln_reference_cache[expr_hash] = expr
+        self._ln_reference_cache[original_expr] = expr
         
         # Limit cache size to prevent memory issues
         if len(self._ln_reference_cache) > 1000:
@@ -1750,29 +2052,46 @@ class EditorCrossSheetMixin:
         
         return expr
 
-    def build_cross_sheet_cache(self):
-        """Build cache for fast cross-sheet lookups"""
+    def build_cross_sheet_cache(self, sheet_names=None):
+        """Build cache for fast cross-sheet lookups.
+        
+        If sheet_names (lower-case) is given, only those sheets are rebuilt.
+        Each entry records the sheet's document and its revision so a later
+        edit to that sheet can be detected without rescanning it.
+        """
         calculator = self.get_calculator()
         if not calculator:
             return
             
-        self._cross_sheet_cache.clear()
+        if sheet_names is None:
+            self._cross_sheet_cache.clear()
         
-        # Build cache for all sheets
+        # Build cache for all requested sheets
         for i in range(calculator.tabs.count()):
             sheet = calculator.tabs.widget(i)
             if sheet != self.parent and hasattr(sheet, 'editor'):
                 sheet_name = calculator.tabs.tabText(i).lower()
+                if sheet_names is not None and sheet_name not in sheet_names:
+                    continue
                 sheet_cache = {}
-                
                 doc = sheet.editor.document()
-                for j in range(doc.blockCount()):
-                    blk = doc.findBlockByNumber(j)
+                
+                # Walk the blocks in order; findBlockByNumber searches from the start each time
+                blk = doc.begin()
+                j = 0
+                while blk.isValid():
                     user_data = blk.userData()
                     if isinstance(user_data, LineData):
                         sheet_cache[user_data.id] = j
+                    blk = blk.next()
+                    j += 1
                         
-                self._cross_sheet_cache[sheet_name] = sheet_cache
+                self._cross_sheet_cache[sheet_name] = (doc, doc.revision(), sheet_cache)
+
+    def _cross_sheet_cache_is_current(self, sheet_name):
+        """Check the cached line map for sheet_name against its document's revision"""
+        entry = self._cross_sheet_cache.get(sheet_name)
+        return entry is not None and entry[0].revision() == entry[1]
 
     def clear_highlighted_sheets_only(self):
         """Clear highlights only from sheets that were previously highlighted"""
@@ -2031,20 +2350,23 @@ class EditorLineManagementMixin:
     """Handles all line management and highlighting functionality for the formula editor"""
     
     def assign_stable_ids(self):
-        doc = self.document()
-        for i in range(doc.blockCount()):
-            blk = doc.findBlockByNumber(i)
+        blk = self.document().begin()
+        while blk.isValid():
             if not isinstance(blk.userData(), LineData):
-                blk.setUserData(LineData(self.next_line_id))
-                self.next_line_id += 1
+                blk.setUserData(LineData(next(self._line_ids)))
+            blk = blk.next()
 
     def reassign_line_ids(self):
         """Assign sequential, stable IDs from top to bottom."""
         doc = self.document()
-        for i in range(doc.blockCount()):
-            blk = doc.findBlockByNumber(i)
-            blk.setUserData(LineData(i + 1))  # IDs start from 1
-        self.next_line_id = doc.blockCount() + 1
+        # Walk the blocks linearly rather than looking each one up by number
+        blk = doc.begin()
+        i = 0
+        while blk.isValid():
+            i += 1
+            blk.setUserData(LineData(i))  # IDs start from 1
+            blk = blk.next()
+        self._line_ids = count(doc.blockCount() + 1)
 
     def highlight_expression(self, block, start, end):
         """Highlight the expression with a light background color"""
@@ -2079,7 +2401,7 @@ class EditorLineManagementMixin:
         
         # Get LN references from current line first for early exit
         current_line_text = self.textCursor().block().text()
-        ln_matches = list(re.finditer(r'\b(?:s\.(.*?)\.)?ln(\d+)\b', current_line_text, re.IGNORECASE))
+        ln_matches = list(_LINE_LN_REF_RE.finditer(current_line_text))
         
         # Early exit if no LN references - just do basic highlighting
         if not ln_matches:
@@ -2129,9 +2451,12 @@ class EditorLineManagementMixin:
         # Clear previous cross-sheet highlights efficiently
         self.clear_highlighted_sheets_only()
         
-        # Build/update cross-sheet cache if needed
-        if not self._cross_sheet_cache:
-            self.build_cross_sheet_cache()
+        # Build cache entries only for referenced sheets that are not cached yet
+        # or have been edited since they were cached
+        missing_sheets = {name for name in {m.group(1).lower() for m in ln_matches if m.group(1)}
+                          if not self._cross_sheet_cache_is_current(name)}
+        if missing_sheets:
+            self.build_cross_sheet_cache(missing_sheets)
         
         # Add current line highlight
         sel = QTextEdit.ExtraSelection()
@@ -2178,46 +2503,45 @@ class EditorLineManagementMixin:
                 
                 # Use cached lookup for cross-sheet references
                 if sheet_name_lower in self._cross_sheet_cache:
-                    sheet_cache = self._cross_sheet_cache[sheet_name_lower]
+                    sheet_cache = self._cross_sheet_cache[sheet_name_lower][2]
                     if ln_id in sheet_cache:
                         line_number = sheet_cache[ln_id]
                         
                         # Find the actual sheet widget
-                        for i in range(calculator.tabs.count()):
-                            if calculator.tabs.tabText(i).lower() == sheet_name_lower:
-                                other_sheet = calculator.tabs.widget(i)
+                        i = calculator.find_sheet_index(sheet_name_lower)
+                        if i >= 0:
+                            other_sheet = calculator.tabs.widget(i)
                                 
-                                # Track that this sheet will have highlights
-                                self._highlighted_sheets.add(other_sheet)
+                            # Track that this sheet will have highlights
+                            self._highlighted_sheets.add(other_sheet)
                                 
-                                # Create editor highlight
-                                doc = other_sheet.editor.document()
-                                blk = doc.findBlockByNumber(line_number)
-                                if blk.isValid():
-                                    highlight_cursor = QTextCursor(blk)
-                                    sel_ref = QTextEdit.ExtraSelection()
-                                    sel_ref.format.setBackground(bg_color)
-                                    sel_ref.format.setProperty(QTextCharFormat.FullWidthSelection, True)
-                                    sel_ref.cursor = highlight_cursor
+                            # Create editor highlight
+                            doc = other_sheet.editor.document()
+                            blk = doc.findBlockByNumber(line_number)
+                            if blk.isValid():
+                                highlight_cursor = QTextCursor(blk)
+                                sel_ref = QTextEdit.ExtraSelection()
+                                sel_ref.format.setBackground(bg_color)
+                                sel_ref.format.setProperty(QTextCharFormat.FullWidthSelection, True)
+                                sel_ref.cursor = highlight_cursor
                                     
-                                    if other_sheet not in cross_sheet_highlights:
-                                        cross_sheet_highlights[other_sheet] = []
-                                    cross_sheet_highlights[other_sheet].append(sel_ref)
+                                if other_sheet not in cross_sheet_highlights:
+                                    cross_sheet_highlights[other_sheet] = []
+                                cross_sheet_highlights[other_sheet].append(sel_ref)
                                     
-                                    # Create results highlight
-                                    if hasattr(other_sheet, 'results'):
-                                        results_block = other_sheet.results.document().findBlockByNumber(line_number)
-                                        if results_block.isValid():
-                                            results_cursor = QTextCursor(results_block)
-                                            sel_result = QTextEdit.ExtraSelection()
-                                            sel_result.format.setBackground(bg_color)
-                                            sel_result.format.setProperty(QTextCharFormat.FullWidthSelection, True)
-                                            sel_result.cursor = results_cursor
+                                # Create results highlight
+                                if hasattr(other_sheet, 'results'):
+                                    results_block = other_sheet.results.document().findBlockByNumber(line_number)
+                                    if results_block.isValid():
+                                        results_cursor = QTextCursor(results_block)
+                                        sel_result = QTextEdit.ExtraSelection()
+                                        sel_result.format.setBackground(bg_color)
+                                        sel_result.format.setProperty(QTextCharFormat.FullWidthSelection, True)
+                                        sel_result.cursor = results_cursor
                                             
-                                            if other_sheet not in cross_sheet_results_highlights:
-                                                cross_sheet_results_highlights[other_sheet] = []
-                                            cross_sheet_results_highlights[other_sheet].append(sel_result)
-                                break
+                                        if other_sheet not in cross_sheet_results_highlights:
+                                            cross_sheet_results_highlights[other_sheet] = []
+                                        cross_sheet_results_highlights[other_sheet].append(sel_result)
                             
             else:  # Regular LN reference - use faster lookup
                 doc = self.document()
@@ -2306,7 +2630,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
-        self.next_line_id = 1
+        self._line_ids = count(1)  # Source of new stable line IDs
         self.default_font_size = 14
         self.current_font_size = self.parent.settings.value('font_size', self.default_font_size, type=int)
         
@@ -2316,7 +2640,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         # Add performance optimizations for highlighting
         self._last_highlighted_line = -1  # Track which line was last highlighted
         self._highlighted_sheets = set()  # Track which sheets have highlights to clear
-        self._cross_sheet_cache = {}  # Cache for cross-sheet lookups: sheet_name -> {line_id: line_number}
+        self._cross_sheet_cache = {}  # Cache for cross-sheet lookups: sheet_name -> (document, revision, {line_id: line_number})
         self._highlight_timer = QTimer(self)  # Debounce timer for highlighting
         self._highlight_timer.setInterval(100)  # 100ms debounce for more aggressive debouncing
         self._highlight_timer.setSingleShot(True)
@@ -2339,10 +2663,10 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         self._ln_normalization_pattern = re.compile(r'\bs\.(.*?)\.ln', re.IGNORECASE)
         self._ln_case_pattern = re.compile(r'\bln(\d+)\b', re.IGNORECASE)
         self._ln_combined_pattern = re.compile(r'\b(S\.)(.*?)\.LN(\d+)\b|\bLN(\d+)\b')
-        self._ln_reference_cache = {}  # expr_hash -> processed_expr for caching LN reference processing
+        self._ln_reference_cache = {}  # expr -> processed_expr for caching LN reference processing
         
         # Add debugging tools for performance analysis
-        self._debug_enabled = True  # Set to False to disable debugging
+        self._debug_enabled = DEBUG_OUTPUT  # Set CALCFORGE_DEBUG=1 to enable debugging
         self._perf_log = []  # Store performance measurements
         self._last_perf_time = 0
         self._call_stack = []  # Track what methods are being called
@@ -2482,24 +2806,14 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         """Calculate the result of a subexpression"""
         try:
             # Handle numbers with leading zeros
-            expr = re.sub(r'\b0+(\d+)\b', r'\1', expr)
+            expr = _LEADING_ZEROS_RE.sub(r'\1', expr)
             
-            # Process LN references if present
-            if re.search(r"\bLN(\d+)\b", expr):
+            # Process LN references if present; the values are substituted in,
+            # so the memoized evaluation below is keyed on the current values
+            if _HOVER_LN_REF_RE.search(expr):
                 expr = self.process_ln_refs(expr)
             
-            # Handle the expression evaluation using the global truncate function
-            result = eval(expr, {"truncate": truncate, "TR": truncate, **GLOBALS}, {})
-            
-            # Format the result nicely
-            if isinstance(result, float):
-                # Round to 6 decimal places to avoid floating point noise
-                result = round(result, 6)
-                # Convert to int if it's a whole number
-                if result.is_integer():
-                    result = int(result)
-            
-            return result
+            return evaluate_subexpression(expr)
             
         except Exception as e:
             return None
@@ -2509,10 +2823,11 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         # Find all matching parentheses pairs
         stack = []
         pairs = []
-        for i, char in enumerate(text):
-            if char == '(':
+        for m in _PAREN_CHAR_RE.finditer(text):
+            i = m.start()
+            if m.group() == '(':
                 stack.append(i)
-            elif char == ')' and stack:
+            elif stack:
                 start = stack.pop()
                 pairs.append((start, i))
         
@@ -2525,7 +2840,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
                 # Get the expression and handle leading zeros
                 expr = text[start+1:end]
                 # Replace numbers with leading zeros
-                expr = re.sub(r'\b0+(\d+)\b', r'\1', expr)
+                expr = _LEADING_ZEROS_RE.sub(r'\1', expr)
                 return expr, (start + 1, end)  # Return both expression and its position
         return None, None
 
@@ -2608,16 +2923,17 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         paren_contents = {}  # Maps opening paren position to its contents
         
         # Find all matching parentheses first
-        for i, char in enumerate(text):
-            if char == '(':
+        for m in _PAREN_CHAR_RE.finditer(text):
+            i = m.start()
+            if m.group() == '(':
                 stack.append(i)
-            elif char == ')' and stack:
+            elif stack:
                 start = stack.pop()
                 paren_pairs[start] = i
                 paren_contents[start] = text[start+1:i]
         
         # Now find operators and their associated expressions
-        operators = list(re.finditer(r'[-+*/^]', text))
+        operators = list(_OPERATOR_RE.finditer(text))
         
         for op_match in operators:
             op_pos = op_match.start()
@@ -2657,7 +2973,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
 
                 # Check if we're over an operator
                 found_operator = False
-                for op_match in re.finditer(r'[-+*/^]', text):
+                for op_match in _OPERATOR_RE.finditer(text):
                     op_start = op_match.start()
                     op_end = op_match.end()
                     if op_start <= pos < op_end:
@@ -2680,7 +2996,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
                 found_ln_tooltip = False
                 
                 # First check for cross-sheet references: s.SheetName.ln2 or S.SheetName.LN2
-                for match in re.finditer(r'\b(?:s|S)\.(.+?)\.(?:ln|LN)(\d+)\b', text):
+                for match in _HOVER_SHEET_REF_RE.finditer(text):
                     start, end = match.span()
                     if start <= pos < end:  # Use exclusive end to avoid boundary issues
                         found_operator = True
@@ -2697,7 +3013,7 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
                 
                 # If no cross-sheet reference found, check for regular LN references
                 if not found_ln_tooltip:
-                    for match in re.finditer(r'\bLN(\d+)\b', text):
+                    for match in _HOVER_LN_REF_RE.finditer(text):
                         start, end = match.span()
                         if start <= pos < end:  # Use exclusive end to avoid boundary issues
                             found_operator = True
@@ -2749,10 +3065,10 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         
         while block.isValid() and top <= event.rect().bottom():
             if block.isVisible() and bottom >= event.rect().top():
-                txt = block.text().strip()
+                is_comment = is_comment_line(block.text())
                 data = block.userData()
-                label = "C" if txt.startswith(":::") else str(data.id if data else block.blockNumber()+1)
-                color = "#7ED321" if txt.startswith(":::") else "#888"
+                label = "C" if is_comment else str(data.id if data else block.blockNumber()+1)
+                color = "#7ED321" if is_comment else "#888"
                 
                 # Check if this is the current line - make it bold and white
                 is_current_line = block.blockNumber() == current_block_number
@@ -2799,157 +3115,6 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         if self._last_highlighted_line != self._last_line:
             self._highlight_timer.start()
 
-    def _handle_unit_conversion(self, expr):
-        """Handle unit conversion expressions like '1 mile to km'"""
-        pattern = r'(\d+(?:\.\d+)?)\s+(\w+)\s+to\s+(\w+)'
-        match = re.match(pattern, expr.lower())
-        if match:
-            value, from_unit, to_unit = match.groups()
-            # Handle unit abbreviations
-            from_unit = UNIT_ABBR.get(from_unit.lower(), from_unit)
-            to_unit = UNIT_ABBR.get(to_unit.lower(), to_unit)
-            try:
-                # Create quantity and convert
-                q = ureg.Quantity(float(value), from_unit)
-                result = q.to(to_unit)
-                # Get the full spelling for display
-                display_unit = UNIT_DISPLAY.get(to_unit, to_unit)
-                # Return both the value and the unit
-                return {'value': float(result.magnitude), 'unit': display_unit}
-            except:
-                return None
-        return None
-
-    def _evaluate_lines(self, lines, vals, out, doc):
-        """Evaluate each line and populate results"""
-        # Evaluate each line
-        for idx, line in enumerate(lines):
-            self.current_line = line  # Store current line for context
-            s = line.strip()
-            if not s:  # Empty line
-                vals[idx] = None
-                blk = doc.findBlockByNumber(idx)
-                data = blk.userData()
-                if isinstance(data, LineData):
-                    self.editor.ln_value_map[data.id] = vals[idx]
-                out.append("")
-                continue
-            
-            if s.startswith(":::"):  # Comment line
-                vals[idx] = None
-                blk = doc.findBlockByNumber(idx)
-                data = blk.userData()
-                if isinstance(data, LineData):
-                    self.editor.ln_value_map[data.id] = vals[idx]
-                out.append("")
-                continue
-
-            # Try special cases first
-            try:
-                # Get the current block and its ID
-                blk = doc.findBlockByNumber(idx)
-                data = blk.userData()
-                current_id = data.id if isinstance(data, LineData) else None
-
-                # Pre-process the expression to handle padded numbers
-                s = self._preprocess_expression(s)
-
-                # Check for D() function call first
-                d_func_match = re.match(r'D\((.*?)\)', s)
-                if d_func_match:
-                    # Extract the content inside D() and process it directly
-                    date_content = d_func_match.group(1)
-                    date_result = handle_date_arithmetic(date_content)
-                    
-                    if date_result is not None:
-                        vals[idx] = date_result
-                        if current_id:
-                            self.editor.ln_value_map[current_id] = vals[idx]
-                        out.append(self.format_number_for_display(date_result, idx + 1))
-                        continue
-
-                # Check for unit conversion
-                unit_result = self._handle_unit_conversion(s)
-                if unit_result is not None:
-                    vals[idx] = unit_result
-                    if current_id:
-                        self.editor.ln_value_map[current_id] = vals[idx]
-                    out.append(self.format_number_for_display(unit_result, idx + 1))
-                    continue
-
-                # Check for currency conversion
-                currency_result = handle_currency_conversion(s)
-                if currency_result is not None:
-                    vals[idx] = currency_result
-                    if current_id:
-                        self.editor.ln_value_map[current_id] = vals[idx]
-                    out.append(self.format_number_for_display(currency_result, idx + 1))
-                    continue
-
-                # Check for truncate function call (both truncate and TR)
-                trunc_match = re.match(r'(?:truncate|TR)\((.*?),(.*?)\)', s)
-                if trunc_match:
-                    # First evaluate the expression
-                    expr = self.editor.process_ln_refs(trunc_match.group(1).strip())
-                    decimals = int(eval(trunc_match.group(2).strip(), {"truncate": truncate, "TR": truncate, **GLOBALS}, {}))
-                    
-                    # Try unit conversion first
-                    unit_result = self._handle_unit_conversion(expr)
-                    if unit_result is not None:
-                        v = truncate(unit_result, decimals)
-                    else:
-                        # Try currency conversion
-                        currency_result = handle_currency_conversion(expr)
-                        if currency_result is not None:
-                            v = truncate(currency_result, decimals)
-                        else:
-                            # If not a unit or currency conversion, evaluate as regular expression
-                            val = eval(expr, {"truncate": truncate, "TR": truncate, **GLOBALS}, {})
-                            v = truncate(val, decimals)
-                        
-                    vals[idx] = v
-                    if current_id:
-                        self.editor.ln_value_map[current_id] = vals[idx]
-                    out.append(self.format_number_for_display(v, idx + 1))
-                    continue
-
-                # Try special commands
-                cmd_result = self._handle_special_commands(s, idx, lines, vals)
-                if cmd_result is not None:
-                    vals[idx] = cmd_result
-                    if current_id:
-                        self.editor.ln_value_map[current_id] = vals[idx]
-                    out.append(self.format_number_for_display(cmd_result, idx + 1))
-                    continue
-
-                # Process LN references if present
-                if re.search(r"\b(?:s\.|S\.)?(?:ln|LN)\d+\b", s, re.IGNORECASE):
-                    s = self.editor.process_ln_refs(s)
-                    # print(f"Line {idx + 1} after processing refs: {s}")  # Debug print - commented for performance
-
-                # Try to evaluate the expression with math functions
-                v = eval(s, {"truncate": truncate, "mean": statistics.mean, "TR": truncate, **GLOBALS}, {})
-                vals[idx] = v
-                if current_id:
-                    self.editor.ln_value_map[current_id] = vals[idx]
-                    # print(f"Stored value {v} for line ID {current_id}")  # Debug print - commented for performance
-                
-                # Format the output
-                out.append(self.format_number_for_display(v, idx + 1))
-            except TimecodeError as e:
-                # Handle TimecodeError specifically to show the actual error message
-                # print(f"Timecode error on line {idx + 1}: {str(e)}")  # Debug print - commented for performance
-                vals[idx] = None
-                if current_id:
-                    self.editor.ln_value_map[current_id] = None
-                out.append(f'TC ERROR: {str(e)}')
-            except Exception as e:
-                # print(f"Error evaluating line {idx + 1}: {str(e)}")  # Debug print - commented for performance
-                vals[idx] = None
-                if current_id:
-                    self.editor.ln_value_map[current_id] = None
-                out.append('ERROR!')
-
     def keyPressEvent(self, event):
         # Handle special key combinations first
         modifiers = event.modifiers()
@@ -2957,7 +3122,8 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
 
         # Handle Ctrl+Shift+Delete as emergency clear for mass delete issues
         if key == Qt.Key_Delete and modifiers == (Qt.ControlModifier | Qt.ShiftModifier):
-            print("DEBUG: Emergency clear triggered - clearing both editor and results")
+            if DEBUG_OUTPUT:
+                print("DEBUG: Emergency clear triggered - clearing both editor and results")
             self.setPlainText("")
             # Find the worksheet parent
             worksheet = self.parent()
@@ -3087,42 +3253,6 @@ class FormulaEditor(QPlainTextEdit, EditorAutoCompletionMixin, EditorPerformance
         if hasattr(self, '_ln_reference_cache'):
             self._ln_reference_cache.clear()
 
-    def build_cross_sheet_cache(self):
-        """Build cache for fast cross-sheet lookups"""
-        calculator = self.get_calculator()
-        if not calculator:
-            return
-            
-        self._cross_sheet_cache.clear()
-        
-        # Build cache for all sheets
-        for i in range(calculator.tabs.count()):
-            sheet = calculator.tabs.widget(i)
-            if sheet != self.parent and hasattr(sheet, 'editor'):
-                sheet_name = calculator.tabs.tabText(i).lower()
-                sheet_cache = {}
-                
-                doc = sheet.editor.document()
-                for j in range(doc.blockCount()):
-                    blk = doc.findBlockByNumber(j)
-                    user_data = blk.userData()
-                    if isinstance(user_data, LineData):
-                        sheet_cache[user_data.id] = j
-                        
-                self._cross_sheet_cache[sheet_name] = sheet_cache
-
-    def invalidate_all_cross_sheet_caches(self):
-        """Invalidate cross-sheet caches in all editor instances"""
-        for i in range(self.tabs.count()):
-            sheet = self.tabs.widget(i)
-            if hasattr(sheet, 'editor'):
-                # Clear original cross-sheet cache
-                if hasattr(sheet.editor, '_cross_sheet_cache'):
-                    sheet.editor._cross_sheet_cache.clear()
-                # Stage 2 Fix: Also clear LN reference cache when cross-sheet values change
-                if hasattr(sheet.editor, '_ln_reference_cache'):
-                    sheet.editor._ln_reference_cache.clear()
-
 class Worksheet(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -3140,7 +3270,7 @@ class Worksheet(QWidget):
         self._line_hashes = {}  # Cache line content hashes for quick comparison
         
         # Expression result caching to avoid recomputing unchanged expressions
-        self._expression_cache = {}  # line_hash -> (result, formatted_result)
+        self._expression_cache = {}  # line_content -> (result, formatted_result)
         self._cache_max_size = 1000  # Limit cache size to prevent memory bloat
         
         # Smart evaluation timing based on content type
@@ -3177,36 +3307,75 @@ class Worksheet(QWidget):
                 self.worksheet = worksheet
 
             def setPlainText(self, text):
-                # Debug: Log every attempt to set results
-                current_editor_text = self.worksheet.editor.toPlainText().strip()
-                lines = self.worksheet.editor.toPlainText().split('\n')
+                editor_text = self.worksheet.editor.toPlainText()
+                current_editor_text = editor_text.strip()
+                lines = editor_text.split('\n')
                 text_lines = text.split('\n') if text else ['']
 
-                print(f"DEBUG: setPlainText called - Editor lines: {len(lines)}, Editor empty: {len(current_editor_text) == 0}, Result lines: {len(text_lines)}")
-                if len(text_lines) > 10:
-                    print(f"DEBUG: Large result set - first few lines: {text_lines[:3]}")
-
                 # Apply mass delete protection at the widget level - catches ALL attempts to set results
                 # Case 1: Single empty line
                 if len(lines) == 1 and len(current_editor_text) == 0:
-                    print(f"DEBUG: Widget-level protection - Single empty line detected, clearing results")
+                    if DEBUG_OUTPUT:
+                        print(f"DEBUG: Widget-level protection - Single empty line detected, clearing results")
                     text = ""
                 # Case 2: Empty editor but many results (condensed results from other tabs)
                 elif len(current_editor_text) == 0 and len(text_lines) > 5:
-                    print(f"DEBUG: Widget-level protection - Empty editor with {len(text_lines)} results detected, clearing condensed results")
+                    if DEBUG_OUTPUT:
+                        print(f"DEBUG: Widget-level protection - Empty editor with {len(text_lines)} results detected, clearing condensed results")
                     text = ""
                 # Case 3: Aggressive protection - Block large result sets that don't match editor line count
                 elif len(text_lines) > len(lines) + 10:  # Much more results than editor lines
-                    print(f"DEBUG: Widget-level protection - Blocking mismatched large result set: {len(text_lines)} results for {len(lines)} editor lines")
+                    if DEBUG_OUTPUT:
+                        print(f"DEBUG: Widget-level protection - Blocking mismatched large result set: {len(text_lines)} results for {len(lines)} editor lines")
                     text = '\n'.join([''] * len(lines))  # Set empty results matching editor line count
 
-                super().setPlainText(text)
+                self._replace_changed_lines(text)
 
                 # Post-evaluation check: Schedule a check after all evaluations are complete
                 QTimer.singleShot(100, self.worksheet.check_and_fix_results)
 
+            def _replace_changed_lines(self, text):
+                """Update only the run of lines that differs from the current results.
+
+                Most evaluations change a handful of result lines, so keeping the
+                unchanged prefix/suffix blocks avoids re-laying-out and rehighlighting
+                the whole results document.
+                """
+                old_lines = self.toPlainText().split('\n')
+                new_lines = text.split('\n')
+                if old_lines == new_lines:
+                    return
+
+                limit = min(len(old_lines), len(new_lines))
+                prefix = 0
+                while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+                    prefix += 1
+                suffix = 0
+                while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+                    suffix += 1
+
+                if prefix == 0 and suffix == 0:
+                    super().setPlainText(text)
+                    return
+
+                new_middle = new_lines[prefix:len(new_lines) - suffix]
+                doc = self.document()
+                cursor = QTextCursor(doc)
+                if suffix:
+                    # Replace whole blocks, each including its trailing newline
+                    cursor.setPosition(doc.findBlockByNumber(prefix).position())
+                    cursor.setPosition(doc.findBlockByNumber(len(old_lines) - suffix).position(), QTextCursor.KeepAnchor)
+                    cursor.insertText(''.join(line + '\n' for line in new_middle))
+                else:
+                    # Changed run reaches the end: replace from the newline before it
+                    previous = doc.findBlockByNumber(prefix - 1)
+                    cursor.setPosition(previous.position() + previous.length() - 1)
+                    cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+                    cursor.insertText(''.join('\n' + line for line in new_middle))
+
         self.results = ProtectedResultsWidget(self)
         self.results.setReadOnly(True)
+        self.results.setUndoRedoEnabled(False)  # Results are rewritten in place; no undo history needed
         font_size = self.settings.value('font_size', 14, type=int)
         self.results.setFont(QFont("Courier New", font_size, QFont.Bold))
         
@@ -3341,8 +3510,14 @@ class Worksheet(QWidget):
         self._navigation_timer.setSingleShot(True)
         self._navigation_timer.timeout.connect(self._end_navigation)
         
-        # Connect text changes to evaluation
-        self.editor.textChanged.connect(self.on_text_potentially_changed)
+        # Connect text changes to evaluation. Bursts of textChanged signals (paste,
+        # autocomplete replacing a word, undo restore) are coalesced into a single
+        # change-detection pass over the latest text.
+        self._text_change_timer = QTimer(self)
+        self._text_change_timer.setSingleShot(True)
+        self._text_change_timer.setInterval(15)
+        self._text_change_timer.timeout.connect(self.on_text_potentially_changed)
+        self.editor.textChanged.connect(self.schedule_text_change_check)
 
         # Connect block count changes to ensure line synchronization
         self.editor.blockCountChanged.connect(self.on_editor_block_count_changed)
@@ -3364,36 +3539,6 @@ class Worksheet(QWidget):
             self.resizeResultsContainer()
         self.results_container.resizeEvent = results_container_resize_event
 
-    def _sync_editor_to_results(self, value):
-        """Sync results scrollbar when editor scrollbar changes"""
-        if not self._syncing_scroll:
-            start_time = None
-            if hasattr(self.editor, '_log_perf'):
-                start_time = self.editor._log_perf("_sync_editor_to_results")
-                
-            self._syncing_scroll = True
-            try:
-                # Get the editor's scrollbar
-                editor_scrollbar = self.editor.verticalScrollBar()
-                results_scrollbar = self.results.verticalScrollBar()
-                
-                # Calculate the scroll ratio to handle different content heights
-                editor_max = max(1, editor_scrollbar.maximum())
-                results_max = max(1, results_scrollbar.maximum())
-                
-                if editor_max > 0 and results_max > 0:
-                    # Calculate proportional position
-                    ratio = value / editor_max if editor_max > 0 else 0
-                    target_value = int(ratio * results_max)
-                    results_scrollbar.setValue(target_value)
-                else:
-                    # Direct value if no scaling needed
-                    results_scrollbar.setValue(value)
-            finally:
-                self._syncing_scroll = False
-                if start_time and hasattr(self.editor, '_log_perf'):
-                    self.editor._log_perf("_sync_editor_to_results", start_time)
-
     def _sync_results_to_editor(self, value):
         """Sync editor scrollbar when results scrollbar changes"""
         if not self._syncing_scroll:
@@ -3500,6 +3645,10 @@ class Worksheet(QWidget):
             editor_scroll_value = self.editor.verticalScrollBar().value()
             self._sync_editor_to_results(editor_scroll_value)
 
+    def schedule_text_change_check(self):
+        """Defer change detection briefly so a burst of edits is processed once"""
+        self._text_change_timer.start()
+
     def on_text_potentially_changed(self):
         """Called when text might have changed - Stage 1 optimized with smart change detection"""
         # Skip text change processing during mass delete operations for other tabs
@@ -3515,7 +3664,8 @@ class Worksheet(QWidget):
 
             # Only block text change processing for tabs OTHER than the one that had the mass delete
             if this_tab_index != mass_delete_tab_index and this_tab_index != -1:
-                print(f"DEBUG: on_text_potentially_changed SKIPPED for tab {this_tab_index} (mass delete was on tab {mass_delete_tab_index}) due to mass delete flag")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: on_text_potentially_changed SKIPPED for tab {this_tab_index} (mass delete was on tab {mass_delete_tab_index}) due to mass delete flag")
                 return
 
         # Get current text content
@@ -3580,8 +3730,7 @@ class Worksheet(QWidget):
             old_has_refs = getattr(self, 'has_cross_sheet_refs', False)
             
             # Detect cross-sheet references
-            cross_sheet_pattern = r'\bS\.[^.]+\.LN\d+\b'
-            has_cross_refs = bool(re.search(cross_sheet_pattern, current_text, re.IGNORECASE))
+            has_cross_refs = bool(_CROSS_SHEET_REF_RE.search(current_text))
             self.has_cross_sheet_refs = has_cross_refs
             
             # print(f"Cross-sheet refs detected: {has_cross_refs} in sheet {current_index}")  # Uncomment for debugging
@@ -3593,8 +3742,8 @@ class Worksheet(QWidget):
                 calculator._last_dependency_content = current_text
             elif has_cross_refs:
                 # Check if the actual cross-sheet references changed (not just any text)
-                old_refs = set(re.findall(cross_sheet_pattern, getattr(calculator, '_last_dependency_content', ''), re.IGNORECASE))
-                new_refs = set(re.findall(cross_sheet_pattern, current_text, re.IGNORECASE))
+                old_refs = set(_CROSS_SHEET_REF_RE.findall(getattr(calculator, '_last_dependency_content', '')))
+                new_refs = set(_CROSS_SHEET_REF_RE.findall(current_text))
                 if old_refs != new_refs:
                     # print(f"🔄 Cross-sheet references changed - rebuilding dependency graph")  # Comment out for normal usage
                     calculator.build_dependency_graph()
@@ -3658,27 +3807,27 @@ class Worksheet(QWidget):
 
     def _preprocess_expression(self, expr):
         """Pre-process expression to handle padded numbers and other special cases"""
+        # Both calls are only recognised at the very start of the line, so the
+        # first three characters decide which (if either) pattern can match
+        head = expr[:3]
+        
         # Handle timecode arithmetic first (BEFORE comma removal to preserve function arguments)
-        tc_match = re.match(r'TC\((.*?)\)', expr)
+        tc_match = _TC_CALL_RE.match(expr) if head == 'TC(' else None
         if tc_match:
             tc_args = tc_match.group(1)
             
-            # Split on commas that aren't inside arithmetic expressions
-            parts = []
-            current = ""
-            paren_level = 0
-            for char in tc_args:
-                if char == ',' and paren_level == 0:
-                    parts.append(current.strip())
-                    current = ""
-                else:
-                    if char == '(':
-                        paren_level += 1
-                    elif char == ')':
-                        paren_level -= 1
-                    current += char
-            if current:
-                parts.append(current.strip())
+            # Split on commas that aren't inside arithmetic expressions. The
+            # arguments end at the first ')', so once a '(' opens, the rest of
+            # them belongs to the argument it started in.
+            paren = tc_args.find('(')
+            if paren < 0:
+                parts = tc_args.split(',')
+            else:
+                parts = tc_args[:paren].split(',')
+                parts[-1] += tc_args[paren:]
+            if not parts[-1]:
+                parts.pop()
+            parts = [part.strip() for part in parts]
             
             # Process each part
             processed_parts = []
@@ -3697,24 +3846,28 @@ class Worksheet(QWidget):
                         # Use the global timecode_to_frames function
                         return str(globals()['timecode_to_frames'](tc, fps))
                     # Match both . and : as separators
-                    part = re.sub(r'\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}', convert_tc, part)
-                    # Then evaluate the arithmetic
+                    part = _TIMECODE_TEXT_RE.sub(convert_tc, part)
+                    # Then evaluate the arithmetic; anything beyond plain numbers and
+                    # operators is left for the final evaluation of the TC() call
+                    code = compile_arithmetic(part)
                     try:
-                        result = eval(part)
+                        if code is None:
+                            raise ValueError(part)
+                        result = eval(code, {'__builtins__': {}}, {})
                         processed_parts.append(str(result))
                     except:
                         processed_parts.append(part)
                 else:
                     # For non-arithmetic parts, check if it's a timecode and quote it
-                    if re.match(r'\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}', part):
+                    if _TIMECODE_TEXT_RE.match(part):
                         # Quote the timecode string
                         part = f'"{part}"'
                     # If it's a frame number, leave it as is
                     elif part.isdigit():
                         pass
                     # If it looks like a timecode but might have spaces, clean it up and quote it
-                    elif re.search(r'\d{1,2}\s*[:.]\s*\d{1,2}\s*[:.]\s*\d{1,2}\s*[:.]\s*\d{1,2}', part):
-                        cleaned = re.sub(r'\s+', '', part).replace('.', ':')
+                    elif _SPACED_TIMECODE_RE.search(part):
+                        cleaned = _WHITESPACE_RE.sub('', part).replace('.', ':')
                         part = f'"{cleaned}"'
                     processed_parts.append(part)
             
@@ -3722,7 +3875,7 @@ class Worksheet(QWidget):
             expr = f"TC({','.join(processed_parts)})"
         
         # Handle aspect ratio calculations
-        ar_match = re.match(r'AR\((.*?)\)', expr, re.IGNORECASE)
+        ar_match = _AR_CALL_RE.match(expr) if head.upper() == 'AR(' else None
         if ar_match:
             ar_args = ar_match.group(1)
             # Split on comma
@@ -3733,23 +3886,21 @@ class Worksheet(QWidget):
                 quoted_parts = [f'"{part}"' for part in parts]
                 expr = f"AR({','.join(quoted_parts)})"
         
-        # Handle commas in numbers (thousands separators) - but avoid function calls
-        # More careful pattern that doesn't match numbers inside parentheses
-        # Pattern to match numbers with commas like 1,234 or 1,234.56
-        # Use negative lookbehind to avoid matching inside function calls
-        # This pattern avoids matching numbers that come after an opening parenthesis
-        comma_number_pattern = r'(?<!\()\b\d{1,3}(?:,\d{3})*(?:\.\d+)?\b(?![^()]*\))'
-        expr = re.sub(comma_number_pattern, remove_thousands_commas, expr)
+        # Handle commas in numbers (thousands separators) - but avoid function calls:
+        # the pattern skips numbers right after an opening parenthesis or inside one
+        if ',' in expr:
+            expr = _THOUSANDS_NUMBER_RE.sub(remove_thousands_commas, expr)
         
         # Replace numbers with leading zeros outside of timecodes and quoted strings
-        expr = re.sub(r'\b0+(\d+)\b', repl_num, expr)
+        if '0' in expr:
+            expr = _LEADING_ZEROS_RE.sub(repl_num, expr)
         
         return expr
 
     def _handle_special_commands(self, expr, idx, lines, vals):
         """Handle special commands like sum() and mean(), with timecode support for min/max/mean"""
         # Extract range or list from parentheses
-        match = re.match(r'(\w+)\((.*?)\)', expr.strip())
+        match = _SPECIAL_COMMAND_RE.match(expr.strip())
         if not match:
             return None
         
@@ -3766,7 +3917,7 @@ class Worksheet(QWidget):
         def is_timecode(value):
             if isinstance(value, str):
                 # Check if it matches timecode pattern HH:MM:SS:FF
-                return bool(re.match(r'^\d{1,2}[:.]\d{1,2}[:.]\d{1,2}[:.]\d{1,2}$', value))
+                return bool(_TIMECODE_RE.match(value))
             return False
         
         # Helper function to convert timecode to frames (using 24fps as default for comparison)
@@ -3813,12 +3964,12 @@ class Worksheet(QWidget):
                 processed_line = self._preprocess_expression(line_text)
                 
                 # Handle special cases that need evaluation context
-                if re.search(r"\b(?:s\.|S\.)?(?:ln|LN)\d+\b", processed_line, re.IGNORECASE):
+                if _LN_REF_RE.search(processed_line):
                     # This line has LN references, we can't evaluate it safely here
                     return None
                 
                 # Try simple evaluation
-                result = eval(processed_line, {"truncate": truncate, "TR": truncate, **GLOBALS}, {})
+                result = eval(compile_expression(processed_line), GLOBALS, {})
                 return result
             except:
                 return None
@@ -3868,20 +4019,18 @@ class Worksheet(QWidget):
                 elif '-' in start_end and ',' not in start_end:
                     # Range notation like "1-5"
                     start, end = map(int, start_end.split('-'))
+                    num_vals = len(vals)
                     for i in range(start-1, end):
-                        if i < len(vals) and vals[i] is not None:
-                            if timecode_mode or is_timecode(vals[i]):
-                                values.append(vals[i])
-                            elif isinstance(vals[i], (int, float)):
-                                values.append(vals[i])
-                        elif i >= len(vals) or vals[i] is None:
+                        value = vals[i] if i < num_vals else None
+                        if value is None:
                             # Try to evaluate if not yet processed
                             value = evaluate_line_if_needed(i)
-                            if value is not None:
-                                if timecode_mode or is_timecode(value):
-                                    values.append(value)
-                                elif isinstance(value, (int, float)):
-                                    values.append(value)
+                            if value is None:
+                                continue
+                        if timecode_mode or is_timecode(value):
+                            values.append(value)
+                        elif isinstance(value, (int, float)):
+                            values.append(value)
                 else:
                     # Comma-separated line numbers like "1,3,5"
                     for arg in start_end.split(','):
@@ -4089,13 +4238,16 @@ class Worksheet(QWidget):
                 elif '-' in start_end and ',' not in start_end:
                     # Range notation like "1-5"
                     start, end = map(int, start_end.split('-'))
+                    num_vals = len(vals)
+                    get_numeric_value = self.editor.get_numeric_value
                     for i in range(start-1, end):
-                        if i < len(vals) and vals[i] is not None:
+                        value = vals[i] if i < num_vals else None
+                        if value is not None:
                             # Extract numeric value from unit conversion results or regular numbers
-                            numeric_val = self.editor.get_numeric_value(vals[i])
+                            numeric_val = get_numeric_value(value)
                             if isinstance(numeric_val, (int, float)):
                                 numbers.append(float(numeric_val))
-                            elif is_timecode(vals[i]):
+                            elif is_timecode(value):
                                 return "ERROR: Timecode values not supported for this function"
                 else:
                     # Comma-separated line numbers like "1,3,5"
@@ -4157,10 +4309,7 @@ class Worksheet(QWidget):
             elif cmd_type == 'count':
                 return len(numbers)
             elif cmd_type == 'product':
-                result = 1
-                for n in numbers:
-                    result *= n
-                return result
+                return math.prod(numbers)
             elif cmd_type == 'variance':
                 return statistics.variance(numbers)
             elif cmd_type in ('stdev', 'std'):
@@ -4170,7 +4319,7 @@ class Worksheet(QWidget):
             elif cmd_type == 'harmmean':
                 return statistics.harmonic_mean(numbers)
             elif cmd_type == 'sumsq':
-                return sum(x*x for x in numbers)
+                return sum(map(mul, numbers, numbers))
             elif cmd_type == 'perc5':
                 return statistics.quantiles(numbers, n=20)[0]  # 5th percentile
             elif cmd_type == 'perc95':
@@ -4200,7 +4349,8 @@ class Worksheet(QWidget):
 
                 # Only block evaluations for tabs OTHER than the one that had the mass delete
                 if this_tab_index != mass_delete_tab_index and this_tab_index != -1:
-                    print(f"DEBUG: evaluate() SKIPPED for tab {this_tab_index} (mass delete was on tab {mass_delete_tab_index}) due to mass delete flag")
+                    if DEBUG_OUTPUT:
+                        print(f"DEBUG: evaluate() SKIPPED for tab {this_tab_index} (mass delete was on tab {mass_delete_tab_index}) due to mass delete flag")
                     return
 
         # Stage 3.2: Try selective evaluation first if beneficial
@@ -4233,7 +4383,7 @@ class Worksheet(QWidget):
         if not changed_lines:
             return False  # No changes
         
-        total_lines = len(current_text.split('\n'))
+        total_lines = current_text.count('\n') + 1
         
         # Skip selective evaluation for small sheets (overhead not worth it)
         if total_lines < 10:
@@ -4432,11 +4582,13 @@ class Worksheet(QWidget):
 
             # Case 1: Single empty line
             if len(lines) == 1 and len(current_editor_text) == 0:
-                print(f"DEBUG: Single empty line detected in selective evaluation - clearing results")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Single empty line detected in selective evaluation - clearing results")
                 out = ['']
             # Case 2: Empty editor but many results (condensed results from other tabs)
             elif len(current_editor_text) == 0 and len(out) > 5:
-                print(f"DEBUG: Empty editor with {len(out)} results detected in selective evaluation - clearing condensed results")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Empty editor with {len(out)} results detected in selective evaluation - clearing condensed results")
                 out = [''] * len(lines)
 
             # Update only the affected lines to minimize UI disruption
@@ -4517,8 +4669,8 @@ class Worksheet(QWidget):
         if changed_line not in self._result_dependencies:
             return set()
         
-        # Get all lines that depend directly on this line's result
-        dependent_lines = self._result_dependencies[changed_line].copy()
+        # Get all lines that depend directly on this line's result (only read below)
+        dependent_lines = self._result_dependencies[changed_line]
         
         # For batch processing, collect all lines that need updating
         lines_to_update = set()
@@ -4566,7 +4718,7 @@ class Worksheet(QWidget):
             
             # Then find and invalidate all dependent lines
             if line in self._result_dependencies:
-                dependents = self._result_dependencies[line].copy()
+                dependents = self._result_dependencies[line]
                 affected_lines.update(dependents)
                 
                 # Recursively find all indirect dependents too
@@ -4586,60 +4738,6 @@ class Worksheet(QWidget):
         # Return full set of lines that need re-evaluation
         return affected_lines.union(changed_lines)
 
-    def _initialize_evaluation(self):
-        """Initialize evaluation state and prepare data structures"""
-        evaluation_context = {}
-        
-        # Debug and performance logging setup
-        if hasattr(self.editor, '_debug_enabled') and self.editor._debug_enabled:
-            start_time = self.editor._log_perf("evaluate")
-            print(f"EVALUATION TRIGGERED at line {self.editor.textCursor().blockNumber()}")
-            
-            # Add stack trace to see what's calling evaluation
-            stack = traceback.extract_stack()
-            print("EVAL CALL STACK:")
-            for frame in stack[-5:-1]:  # Show last 4 frames before this one
-                print(f"  {frame.filename}:{frame.lineno} in {frame.name}()")
-        
-        # Store current cursor and scroll positions
-        evaluation_context['cursor'] = self.editor.textCursor()
-        evaluation_context['editor_scroll'] = self.editor.verticalScrollBar().value()
-        evaluation_context['results_scroll'] = self.results.verticalScrollBar().value()
-        
-        # Check if this is a cursor-triggered evaluation
-        evaluation_context['is_cursor_triggered'] = hasattr(self.editor, '_cursor_triggered_eval')
-        if evaluation_context['is_cursor_triggered']:
-            delattr(self.editor, '_cursor_triggered_eval')
-        
-        # Ensure line IDs are properly assigned
-        self.editor.reassign_line_ids()
-        
-        # Initialize data structures
-        evaluation_context['lines'] = self.editor.toPlainText().split("\n")
-        evaluation_context['vals'] = [None] * len(evaluation_context['lines'])
-        self.editor.ln_value_map = {}
-        
-        # Stage 2 Optimization: Clear LN reference cache when values change
-        self.editor.clear_ln_reference_cache()
-        
-        id_map = {}
-        evaluation_context['doc'] = self.editor.document()
-        
-        # Update separator lines
-        self.editor.update_separator_lines()
-        
-        # Build id_map and initialize ln_value_map
-        for i in range(evaluation_context['doc'].blockCount()):
-            blk = evaluation_context['doc'].findBlockByNumber(i)
-            d = blk.userData()
-            if isinstance(d, LineData):
-                id_map[d.id] = i
-                # Initialize with None to ensure the ID exists in the map
-                self.editor.ln_value_map[d.id] = None
-        
-        evaluation_context['id_map'] = id_map
-        return evaluation_context
-
     def _finalize_evaluation(self, out, evaluation_context):
         """Finalize evaluation and update UI"""
         # Ensure all empty lines have empty results
@@ -4678,11 +4776,13 @@ class Worksheet(QWidget):
 
         # Case 1: Single empty line
         if len(lines) == 1 and len(current_editor_text) == 0:
-            print(f"DEBUG: Single empty line detected - clearing results")
+            if DEBUG_OUTPUT:
+                print(f"DEBUG: Single empty line detected - clearing results")
             text_content = ""
         # Case 2: Empty editor but many results (condensed results from other tabs)
         elif len(current_editor_text) == 0 and len(out) > 5:
-            print(f"DEBUG: Empty editor with {len(out)} results detected - clearing condensed results")
+            if DEBUG_OUTPUT:
+                print(f"DEBUG: Empty editor with {len(out)} results detected - clearing condensed results")
             text_content = ""
         else:
             # Update results with plain text (no HTML needed since we're using QPlainTextEdit)
@@ -4701,7 +4801,8 @@ class Worksheet(QWidget):
                 # Use a timer to clear the flag after a short delay to allow all related evaluations to complete
                 def clear_mass_delete_flag():
                     if hasattr(calculator, '_mass_delete_in_progress'):
-                        print(f"DEBUG: Mass delete flag CLEARED from True to False (delayed)")
+                        if DEBUG_OUTPUT:
+                            print(f"DEBUG: Mass delete flag CLEARED from True to False (delayed)")
                         calculator._mass_delete_in_progress = False
 
                 # Clear the flag after 1000ms to allow all cascading evaluations to be blocked
@@ -4794,45 +4895,55 @@ class Worksheet(QWidget):
     def check_and_fix_results(self):
         """Post-evaluation check: Implement the simple fix suggested by user"""
         try:
-            current_editor_text = self.editor.toPlainText().strip()
-            lines = self.editor.toPlainText().split('\n')
+            editor_text = self.editor.toPlainText()
+            current_editor_text = editor_text.strip()
+            lines = editor_text.split('\n')
             current_results = self.results.toPlainText().strip()
 
-            print(f"DEBUG: Post-evaluation check - Editor lines: {len(lines)}, Editor empty: {len(current_editor_text) == 0}, Has results: {len(current_results) > 0}")
+            if DEBUG_OUTPUT:
+                print(f"DEBUG: Post-evaluation check - Editor lines: {len(lines)}, Editor empty: {len(current_editor_text) == 0}, Has results: {len(current_results) > 0}")
 
             # Simple fix: If there is only 1 line and the expression field is empty, clear line 1 results
             if len(lines) == 1 and len(current_editor_text) == 0 and len(current_results) > 0:
-                print(f"DEBUG: Post-evaluation fix - Single empty line with results detected, clearing results")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Post-evaluation fix - Single empty line with results detected, clearing results")
                 # Directly clear the results without triggering more evaluations
                 self.results.blockSignals(True)
                 self.results.setPlainText("")
                 self.results.blockSignals(False)
             # Extended fix: If editor is completely empty but has many results, clear them
-            elif len(current_editor_text) == 0 and len(current_results.split('\n')) > 5:
-                print(f"DEBUG: Post-evaluation fix - Empty editor with many results detected, clearing results")
+            elif len(current_editor_text) == 0 and current_results.count('\n') + 1 > 5:
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Post-evaluation fix - Empty editor with many results detected, clearing results")
                 self.results.blockSignals(True)
                 self.results.setPlainText("")
                 self.results.blockSignals(False)
         except Exception as e:
-            print(f"DEBUG: Error in check_and_fix_results: {e}")
+            if DEBUG_OUTPUT:
+                print(f"DEBUG: Error in check_and_fix_results: {e}")
 
     def efficient_brute_force_fix(self):
         """Efficient brute force fix - runs continuously with 300ms interval"""
         try:
-            current_editor_text = self.editor.toPlainText().strip()
-            lines = self.editor.toPlainText().split('\n')
+            editor_text = self.editor.toPlainText()
+            current_editor_text = editor_text.strip()
+            lines = editor_text.split('\n')
             current_results = self.results.toPlainText()
-            result_lines = current_results.split('\n')
 
             # Case 1: Single empty line (original fix)
             if len(lines) == 1 and len(current_editor_text) == 0 and len(current_results.strip()) > 0:
-                print(f"DEBUG: Efficient brute force fix - Single empty line with results detected, clearing results")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Efficient brute force fix - Single empty line with results detected, clearing results")
                 self.results.blockSignals(True)
                 self.results.setPlainText("")
                 self.results.blockSignals(False)
                 return
 
-            # Case 2: Check for condensed results in individual lines
+            # Case 2: Check for condensed results in individual lines. Only blank
+            # editor lines can carry them, so most polls stop here.
+            if all(line.strip() for line in lines):
+                return
+            result_lines = current_results.split('\n')
             fixed_results = []
             results_were_fixed = False
 
@@ -4853,7 +4964,8 @@ class Worksheet(QWidget):
                         )
 
                         if is_condensed:
-                            print(f"DEBUG: Condensed results detected on line {i+1}: '{result_content[:50]}...'")
+                            if DEBUG_OUTPUT:
+                                print(f"DEBUG: Condensed results detected on line {i+1}: '{result_content[:50]}...'")
                             fixed_results.append("")  # Clear the condensed results
                             results_were_fixed = True
                         else:
@@ -4865,7 +4977,8 @@ class Worksheet(QWidget):
 
             # Apply the fix if we found condensed results
             if results_were_fixed:
-                print(f"DEBUG: Applying condensed results fix")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Applying condensed results fix")
                 self.results.blockSignals(True)
                 self.results.setPlainText('\n'.join(fixed_results))
                 self.results.blockSignals(False)
@@ -4980,9 +5093,10 @@ class Worksheet(QWidget):
                 out.append("")
                 continue
 
-            # Stage 1: Check for cached result first (skip for LN references and cross-sheet refs)
-            has_references = (re.search(r"\b(?:s\.|S\.)?(?:ln|LN)\d+\b", s, re.IGNORECASE) or
-                            re.search(r'\bS\.[^.]+\.LN\d+\b', s, re.IGNORECASE))
+            # Stage 1: Check for cached result first (skip for LN references and cross-sheet refs).
+            # Every reference form contains "ln", so most lines skip the regex entirely;
+            # cross-sheet references are LN references too.
+            has_references = 'ln' in s.lower() and _LN_REF_RE.search(s)
             
             if not has_references:
                 cached_result = self.get_cached_result(s, idx + 1)
@@ -5011,7 +5125,7 @@ class Worksheet(QWidget):
                     continue
 
             # Tab switching optimization - Check for cross-sheet references in this line
-            if re.search(r'\bS\.[^.]+\.LN\d+\b', s, re.IGNORECASE):
+            if has_references and _CROSS_SHEET_REF_RE.search(s):
                 detected_cross_sheet_refs = True
 
             # Try special cases first
@@ -5024,8 +5138,13 @@ class Worksheet(QWidget):
                 # Pre-process the expression to handle padded numbers
                 s = self._preprocess_expression(s)
 
+                # Cheap guards so plain arithmetic skips the special-case dispatchers:
+                # conversions need "to", calls need "(", D()/truncate are prefixes
+                has_to = 'to' in s.lower()
+                has_paren = '(' in s
+
                 # Check for D() function call first
-                d_func_match = re.match(r'D\((.*?)\)', s)
+                d_func_match = s.startswith('D(') and _DATE_CALL_RE.match(s)
                 if d_func_match:
                     # Extract the content inside D() and process it directly
                     date_content = d_func_match.group(1)
@@ -5042,8 +5161,14 @@ class Worksheet(QWidget):
                             self.cache_evaluation_result(line.strip(), date_result, formatted_result, idx + 1)
                         continue
 
+                # One match covers both the unit and the currency conversion forms
+                conversion_match = has_to and _CONVERSION_RE.match(s)
+                
                 # Check for unit conversion
-                unit_result = self._handle_unit_conversion(s)
+                unit_result = None
+                if conversion_match and conversion_match.group(1):
+                    value, from_unit, to_unit = conversion_match.group(1, 2, 3)
+                    unit_result = self._convert_units(value, from_unit.lower(), to_unit.lower())
                 if unit_result is not None:
                     vals[idx] = unit_result
                     if current_id:
@@ -5056,7 +5181,7 @@ class Worksheet(QWidget):
                     continue
 
                 # Check for currency conversion
-                currency_result = handle_currency_conversion(s)
+                currency_result = convert_currency(*conversion_match.group(4, 5, 6)) if conversion_match else None
                 if currency_result is not None:
                     vals[idx] = currency_result
                     if current_id:
@@ -5069,24 +5194,28 @@ class Worksheet(QWidget):
                     continue
 
                 # Check for truncate function call (both truncate and TR)
-                trunc_match = re.match(r'(?:truncate|TR)\((.*?),(.*?)\)', s)
+                trunc_match = s.startswith(('truncate(', 'TR(')) and _TRUNCATE_CALL_RE.match(s)
                 if trunc_match:
                     # First evaluate the expression
                     expr = self.editor.process_ln_refs(trunc_match.group(1).strip())
-                    decimals = int(eval(trunc_match.group(2).strip(), {"truncate": truncate, "TR": truncate, **GLOBALS}, {}))
+                    decimals = int(eval(compile_expression(trunc_match.group(2).strip()), GLOBALS, {}))
                     
                     # Try unit conversion first
-                    unit_result = self._handle_unit_conversion(expr)
+                    conversion_match = _CONVERSION_RE.match(expr)
+                    unit_result = None
+                    if conversion_match and conversion_match.group(1):
+                        value, from_unit, to_unit = conversion_match.group(1, 2, 3)
+                        unit_result = self._convert_units(value, from_unit.lower(), to_unit.lower())
                     if unit_result is not None:
                         v = truncate(unit_result, decimals)
                     else:
                         # Try currency conversion
-                        currency_result = handle_currency_conversion(expr)
+                        currency_result = convert_currency(*conversion_match.group(4, 5, 6)) if conversion_match else None
                         if currency_result is not None:
                             v = truncate(currency_result, decimals)
                         else:
                             # If not a unit or currency conversion, evaluate as regular expression
-                            val = eval(expr, {"truncate": truncate, "TR": truncate, **GLOBALS}, {})
+                            val = eval(compile_expression(expr), GLOBALS, {})
                             v = truncate(val, decimals)
                         
                     vals[idx] = v
@@ -5096,7 +5225,7 @@ class Worksheet(QWidget):
                     continue
 
                 # Try special commands
-                cmd_result = self._handle_special_commands(s, idx, lines, vals)
+                cmd_result = self._handle_special_commands(s, idx, lines, vals) if has_paren else None
                 if cmd_result is not None:
                     vals[idx] = cmd_result
                     if current_id:
@@ -5105,12 +5234,12 @@ class Worksheet(QWidget):
                     continue
 
                 # Process LN references if present
-                if re.search(r"\b(?:s\.|S\.)?(?:ln|LN)\d+\b", s, re.IGNORECASE):
+                if has_references and _LN_REF_RE.search(s):
                     s = self.editor.process_ln_refs(s)
                     # print(f"Line {idx + 1} after processing refs: {s}")  # Debug print - commented for performance
 
                 # Try to evaluate the expression with math functions
-                v = eval(s, {"truncate": truncate, "mean": statistics.mean, "TR": truncate, **GLOBALS}, {})
+                v = eval_expression(s)
                 vals[idx] = v
                 if current_id:
                     self.editor.ln_value_map[current_id] = vals[idx]
@@ -5142,41 +5271,39 @@ class Worksheet(QWidget):
         
         return out
 
-    def _handle_unit_conversion(self, expr):
-        """Handle unit conversion expressions like '1 mile to km'"""
-        pattern = r'(\d+(?:\.\d+)?)\s+(\w+)\s+to\s+(\w+)'
-        match = re.match(pattern, expr.lower())
-        if match:
-            value, from_unit, to_unit = match.groups()
-            # Handle unit abbreviations
-            from_unit = UNIT_ABBR.get(from_unit.lower(), from_unit)
-            to_unit = UNIT_ABBR.get(to_unit.lower(), to_unit)
-            try:
-                # Create quantity and convert
-                q = ureg.Quantity(float(value), from_unit)
-                result = q.to(to_unit)
-                # Get the full spelling for display
-                display_unit = UNIT_DISPLAY.get(to_unit, to_unit)
-                # Return both the value and the unit
-                return {'value': float(result.magnitude), 'unit': display_unit}
-            except:
-                return None
-        return None
+    def _convert_units(self, value, from_unit, to_unit):
+        """Convert an already-parsed unit expression (lower-case unit names)"""
+        # Handle unit abbreviations; currency names are not pint units, so skip
+        # the failing pint parse and leave them to convert_currency
+        from_kind, from_abbr = _CONVERSION_NAMES.get(from_unit, _UNLISTED_NAME)
+        to_kind, to_abbr = _CONVERSION_NAMES.get(to_unit, _UNLISTED_NAME)
+        if from_kind == 'currency' or to_kind == 'currency':
+            return None
+        from_unit = from_abbr or from_unit
+        to_unit = to_abbr or to_unit
+        try:
+            # Scale by the cached factor; pint only parses each unit pair once
+            factor = unit_conversion_factor(from_unit, to_unit)
+            if factor is not None:
+                magnitude = float(value) * factor
+            else:
+                # Offset units (temperatures) need pint's full conversion
+                magnitude = ureg.Quantity(float(value), from_unit).to(to_unit).magnitude
+            # Get the full spelling for display
+            display_unit = UNIT_DISPLAY.get(to_unit, to_unit)
+            # Return both the value and the unit
+            return {'value': float(magnitude), 'unit': display_unit}
+        except:
+            return None
 
     # Stage 1 Performance Optimization Methods
     def _update_line_hashes(self):
         """Update cached hashes for all current lines"""
-        import hashlib
-        self._line_hashes = {}
-        for i, line in enumerate(self._last_lines):
-            # Create a hash of the line content for fast comparison
-            line_hash = hashlib.md5(line.encode('utf-8')).hexdigest()
-            self._line_hashes[i] = line_hash
+        # Python strings cache their own hash, so each line is its own key
+        self._line_hashes = dict(enumerate(self._last_lines))
 
     def detect_changed_lines(self, old_text, new_text):
         """Compare line by line to identify actual changes - Stage 1 optimization"""
-        import hashlib
-        
         old_lines = old_text.split('\n')
         new_lines = new_text.split('\n')
         changed_lines = set()
@@ -5218,11 +5345,6 @@ class Worksheet(QWidget):
         if not non_whitespace_changes:
             return 'whitespace'
         
-        # Check for simple math expressions
-        simple_math_pattern = r'^[0-9\s+\-*/().]+$'
-        ln_pattern = r'\bLN\d+\b'
-        cross_sheet_pattern = r'\bS\.[^.]+\.LN\d+\b'
-        function_pattern = r'\b(?:TC|AR|truncate|mean|TR)\s*\('
         
         has_ln_refs = False
         has_cross_sheet = False
@@ -5233,13 +5355,13 @@ class Worksheet(QWidget):
             if not line:
                 continue
                 
-            if re.search(cross_sheet_pattern, line, re.IGNORECASE):
+            if _CROSS_SHEET_REF_RE.search(line):
                 has_cross_sheet = True
-            elif re.search(ln_pattern, line, re.IGNORECASE):
+            elif _LN_WORD_RE.search(line):
                 has_ln_refs = True
-            elif re.search(function_pattern, line, re.IGNORECASE):
+            elif _SPECIAL_FUNCTION_CALL_RE.search(line):
                 has_functions = True
-            elif re.match(simple_math_pattern, line):
+            elif _SIMPLE_MATH_RE.match(line):
                 has_simple_math = True
         
         # Return most complex type found
@@ -5284,17 +5406,13 @@ class Worksheet(QWidget):
 
     def get_cached_result(self, line_content, line_number):
         """Get cached evaluation result if available - Stage 1 optimization"""
-        import hashlib
-        
-        if not line_content.strip():
+        if not line_content or line_content.isspace():
             return None
             
-        # Create hash for the line content
-        line_hash = hashlib.md5(line_content.encode('utf-8')).hexdigest()
-        
-        # Check if we have a cached result
-        if line_hash in self._expression_cache:
-            cached_result, cached_formatted = self._expression_cache[line_hash]
+        # Check if we have a cached result (keyed by the line text itself)
+        cached = self._expression_cache.get(line_content)
+        if cached is not None:
+            cached_result, cached_formatted = cached
             
             # Update raw values for cached results
             if isinstance(cached_result, (int, float)):
@@ -5306,14 +5424,9 @@ class Worksheet(QWidget):
 
     def cache_evaluation_result(self, line_content, result, formatted_result, line_number):
         """Cache evaluation result for future use - Stage 1 optimization"""
-        import hashlib
-        
-        if not line_content.strip():
+        if not line_content or line_content.isspace():
             return
             
-        # Create hash for the line content
-        line_hash = hashlib.md5(line_content.encode('utf-8')).hexdigest()
-        
         # Manage cache size
         if len(self._expression_cache) >= self._cache_max_size:
             # Remove oldest entries (simple FIFO approach)
@@ -5322,7 +5435,7 @@ class Worksheet(QWidget):
                 del self._expression_cache[key]
         
         # Store the result
-        self._expression_cache[line_hash] = (result, formatted_result)
+        self._expression_cache[line_content] = (result, formatted_result)
 
     def should_skip_evaluation(self, changed_lines):
         """Determine if evaluation should be skipped - Stage 1 optimization"""
@@ -5540,9 +5653,6 @@ class Worksheet(QWidget):
             if hasattr(calculator, '_mass_delete_in_progress') and calculator._mass_delete_in_progress:
                 return
         
-        # Pattern to detect cross-sheet references: S.SheetName.LN#
-        cross_sheet_pattern = r'\bS\.[^.]+\.LN\d+\b'
-        
         # Get current content
         lines = self.editor.toPlainText().split('\n')
         doc = self.results.document()
@@ -5574,7 +5684,7 @@ class Worksheet(QWidget):
                 continue
             
             # Check if this line has cross-sheet references
-            if re.search(cross_sheet_pattern, line, re.IGNORECASE):
+            if _CROSS_SHEET_REF_RE.search(line):
                 try:
                     # Process cross-sheet references
                     processed_line = self.editor.process_ln_refs(line)
@@ -5669,17 +5779,70 @@ class Worksheet(QWidget):
         self.editor.update_separator_lines()
         
         # Build id_map and initialize ln_value_map
-        for i in range(evaluation_context['doc'].blockCount()):
-            blk = evaluation_context['doc'].findBlockByNumber(i)
+        blk = evaluation_context['doc'].begin()
+        i = 0
+        while blk.isValid():
             d = blk.userData()
             if isinstance(d, LineData):
                 id_map[d.id] = i
                 # Initialize with None to ensure the ID exists in the map
                 self.editor.ln_value_map[d.id] = None
+            blk = blk.next()
+            i += 1
         
         evaluation_context['id_map'] = id_map
         return evaluation_context
 
+def load_worksheets_file(path):
+    """Read the saved {sheet name: content} mapping from path"""
+    raw = path.read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+# Shared stdlib encoder for when orjson is missing; like orjson it emits UTF-8
+# rather than \u escapes, so both backends write the same bytes
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+def _json_bytes(value):
+    """Encode value as UTF-8 JSON with the shared encoder"""
+    return _JSON_ENCODER.encode(value).encode('utf-8')
+
+def save_worksheets_file(path, sheets, indent=None):
+    """Write (sheet name, content) pairs to path as a JSON object.
+
+    Sheets are encoded and written one at a time, so only a single sheet's
+    text is held in encoded form. The output is compact by default; pass
+    indent for the json.dumps(indent=...) layout. A repeated name loads the
+    same way as a dict built from the pairs.
+    The file is written next to path and swapped in once complete, so a
+    crash mid-save leaves the previous worksheets intact.
+    """
+    dumps = orjson.dumps if orjson is not None else _json_bytes
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb', buffering=1 << 20) as f:
+            if indent is None:
+                first, separator, colon, closing = b'', b',', b':', b'}'
+            else:
+                first = b'\n' + b' ' * indent
+                separator, colon, closing = b',' + first, b': ', b'\n}'
+            f.write(b'{')
+            lead = first
+            for name, content in sheets:
+                f.write(lead + dumps(name) + colon + dumps(content))
+                lead = separator
+            f.write(closing if lead is separator else b'}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
 class Calculator(QWidget):
     def __init__(self):
         super().__init__()
@@ -5698,6 +5861,7 @@ class Calculator(QWidget):
         # Tab switching optimization - Stage 1: Change tracking system
         self._sheet_changed_flags = {}  # Tab index -> bool (True if sheet content changed)
         self._last_active_sheet = None  # Track the previously active sheet index
+        self._sheet_name_index = {}  # Lowercase sheet name -> tab index, rebuilt lazily
         
         # Stage 3: Dependency Graph Optimization
         self._sheet_dependencies = {}  # Tab index -> set of tab indices that this sheet references
@@ -5770,22 +5934,28 @@ class Calculator(QWidget):
         self.tabs.tabCloseRequested.connect(self.close_tab)
         self.tabs.tabBarDoubleClicked.connect(self.rename_tab)
         self.tabs.currentChanged.connect(self.on_tab_changed)  # Connect tab change signal
+        self.tabs.tabBar().tabMoved.connect(lambda *_: self._sheet_name_index.clear())
         main.addWidget(self.tabs)
         
         # Load saved worksheets or create new one
         wf = Path(os.path.dirname(sys.argv[0]))/"worksheets.json"
         if wf.exists():
             try:
-                data = json.loads(wf.read_text())
+                data = load_worksheets_file(wf)
                 self.tabs.clear()
-                for idx, (name, content) in enumerate(data.items()):
-                    ws = Worksheet(self)
-                    self.tabs.addTab(ws, name)
-                    ws.editor.setPlainText(content)
-                    if self.splitter_state:
-                        ws.splitter.restoreState(self.splitter_state)
-                    # Tab switching optimization - Initialize change flag for loaded sheet
-                    self._sheet_changed_flags[idx] = False
+                # Add every sheet before the tab widget repaints or relayouts
+                self.tabs.setUpdatesEnabled(False)
+                try:
+                    for name, content in data.items():
+                        ws = Worksheet(self)
+                        self.tabs.addTab(ws, name)
+                        ws.editor.setPlainText(content)
+                        if self.splitter_state:
+                            ws.splitter.restoreState(self.splitter_state)
+                finally:
+                    self.tabs.setUpdatesEnabled(True)
+                # Tab switching optimization - Initialize change flags for loaded sheets
+                self._sheet_changed_flags.update(dict.fromkeys(range(len(data)), False))
                 # Position cursor at end of first sheet
                 if self.tabs.count() > 0:
                     self.position_cursor_at_end(self.tabs.widget(0).editor)
@@ -5995,8 +6165,8 @@ class Calculator(QWidget):
         ws=self.tabs.currentWidget()
         if hasattr(ws,'splitter'): self.settings.setValue('splitterState',ws.splitter.saveState())
         wf=Path(os.path.dirname(sys.argv[0]))/"worksheets.json"
-        data={self.tabs.tabText(i):self.tabs.widget(i).editor.toPlainText() for i in range(self.tabs.count())}
-        wf.write_text(json.dumps(data,indent=2))
+        save_worksheets_file(wf, ((self.tabs.tabText(i), self.tabs.widget(i).editor.toPlainText())
+                                  for i in range(self.tabs.count())))
         super().closeEvent(event)
 
     def show_help(self):
@@ -6373,7 +6543,8 @@ class Calculator(QWidget):
         if hasattr(self, '_mass_delete_in_progress') and self._mass_delete_in_progress:
             mass_delete_tab_index = getattr(self, '_mass_delete_tab_index', -1)
             if index != mass_delete_tab_index:
-                print(f"DEBUG: Clearing mass delete flag due to tab switch from {mass_delete_tab_index} to {index}")
+                if DEBUG_OUTPUT:
+                    print(f"DEBUG: Clearing mass delete flag due to tab switch from {mass_delete_tab_index} to {index}")
                 self._mass_delete_in_progress = False
                 if hasattr(self, '_mass_delete_tab_index'):
                     delattr(self, '_mass_delete_tab_index')
@@ -6497,8 +6668,28 @@ class Calculator(QWidget):
         # Update last active sheet
         self._last_active_sheet = index
 
+    def find_sheet_index(self, sheet_name):
+        """Return the tab index of the sheet named sheet_name (case insensitive), or -1"""
+        key = sheet_name.lower()
+        index = self._sheet_name_index
+        idx = index.get(key)
+        # Tabs can be renamed, added or restored by undo without going through
+        # here, so confirm a hit and rebuild the index on a miss
+        if idx is not None and idx < self.tabs.count() and self.tabs.tabText(idx).lower() == key:
+            return idx
+        return self._rebuild_sheet_name_index().get(key, -1)
+
+    def _rebuild_sheet_name_index(self):
+        """Recompute the lowercase sheet name index from the current tabs"""
+        index = self._sheet_name_index
+        index.clear()
+        for i in range(self.tabs.count()):
+            index.setdefault(self.tabs.tabText(i).lower(), i)
+        return index
+
     def invalidate_all_cross_sheet_caches(self):
         """Invalidate cross-sheet caches in all editor instances"""
+        self._sheet_name_index.clear()
         for i in range(self.tabs.count()):
             sheet = self.tabs.widget(i)
             if hasattr(sheet, 'editor'):
@@ -6515,8 +6706,8 @@ class Calculator(QWidget):
         self._sheet_dependencies.clear()
         self._sheet_dependents.clear()
         
-        # Pattern to detect cross-sheet references: S.SheetName.LN#
-        cross_sheet_pattern = r'\bS\.([^.]+)\.LN\d+\b'
+        # Lowercase every tab name once for the whole pass
+        sheet_indices = self._rebuild_sheet_name_index()
         
         for sheet_idx in range(self.tabs.count()):
             sheet = self.tabs.widget(sheet_idx)
@@ -6528,23 +6719,21 @@ class Calculator(QWidget):
             
             # Get sheet content and find cross-sheet references
             content = sheet.editor.toPlainText()
-            matches = re.finditer(cross_sheet_pattern, content, re.IGNORECASE)
+            matches = _CROSS_SHEET_NAME_RE.finditer(content)
             
             for match in matches:
                 referenced_sheet_name = match.group(1).lower()
                 
                 # Find the tab index for this sheet name
-                for target_idx in range(self.tabs.count()):
-                    target_sheet_name = self.tabs.tabText(target_idx).lower()
-                    if target_sheet_name == referenced_sheet_name:
-                        # This sheet (sheet_idx) depends on target_idx
-                        self._sheet_dependencies[sheet_idx].add(target_idx)
-                        
-                        # Add reverse dependency: target_idx has sheet_idx as a dependent
-                        if target_idx not in self._sheet_dependents:
-                            self._sheet_dependents[target_idx] = set()
-                        self._sheet_dependents[target_idx].add(sheet_idx)
-                        break
+                target_idx = sheet_indices.get(referenced_sheet_name)
+                if target_idx is not None:
+                    # This sheet (sheet_idx) depends on target_idx
+                    self._sheet_dependencies[sheet_idx].add(target_idx)
+                    
+                    # Add reverse dependency: target_idx has sheet_idx as a dependent
+                    if target_idx not in self._sheet_dependents:
+                        self._sheet_dependents[target_idx] = set()
+                    self._sheet_dependents[target_idx].add(sheet_idx)
         
         # Print dependency summary (only in debug mode)
         DEBUG_TAB_SWITCHING = False  # This should match the debug flag
@@ -6609,6 +6798,21 @@ class Calculator(QWidget):
         # Clear pending updates
         self._pending_updates.clear()
 
+class SheetSnapshot:
+    """Name, content and cursor position of one sheet in an undo state"""
+    __slots__ = ('name', 'content', 'cursor_position')
+    
+    def __init__(self, name, content, cursor_position):
+        self.name = name
+        self.content = content
+        self.cursor_position = cursor_position
+    
+    def __eq__(self, other):
+        if not isinstance(other, SheetSnapshot):
+            return NotImplemented
+        return (self.name == other.name and self.content == other.content
+                and self.cursor_position == other.cursor_position)
+
 class UndoManager:
     """Manages undo/redo functionality for the calculator with a FIFO buffer"""
     
@@ -6642,15 +6846,22 @@ class UndoManager:
             'timestamp': time.time()
         }
         
+        # Sheets that haven't changed since the last snapshot reuse its strings,
+        # so the undo history holds one copy of their text instead of one per state
+        previous = self._last_saved_state['sheets'] if self._last_saved_state else ()
+        
         # Capture all sheet data
         for i in range(calculator.tabs.count()):
             sheet = calculator.tabs.widget(i)
             cursor_position = sheet.editor.textCursor().position()
-            sheet_data = {
-                'name': calculator.tabs.tabText(i),
-                'content': sheet.editor.toPlainText(),
-                'cursor_position': cursor_position
-            }
+            name = calculator.tabs.tabText(i)
+            content = sheet.editor.toPlainText()
+            if i < len(previous):
+                if previous[i].content == content:
+                    content = previous[i].content
+                if previous[i].name == name:
+                    name = previous[i].name
+            sheet_data = SheetSnapshot(name, content, cursor_position)
             state['sheets'].append(sheet_data)
         
         return state
@@ -6712,14 +6923,14 @@ class UndoManager:
                 sheet = calculator.tabs.widget(i)
                 
                 # Restore sheet name
-                calculator.tabs.setTabText(i, sheet_data['name'])
+                calculator.tabs.setTabText(i, sheet_data.name)
                 
                 # Restore content
-                sheet.editor.setPlainText(sheet_data['content'])
+                sheet.editor.setPlainText(sheet_data.content)
                 
                 # Restore cursor position
                 cursor = sheet.editor.textCursor()
-                cursor.setPosition(min(sheet_data['cursor_position'], len(sheet_data['content'])))
+                cursor.setPosition(min(sheet_data.cursor_position, len(sheet_data.content)))
                 sheet.editor.setTextCursor(cursor)
                 
                 # Re-evaluate the sheet
@@ -6750,7 +6961,7 @@ class UndoManager:
         """Reconnect text change signals after restoration"""
         for i in range(calculator.tabs.count()):
             sheet = calculator.tabs.widget(i)
-            sheet.editor.textChanged.connect(sheet.on_text_potentially_changed)
+            sheet.editor.textChanged.connect(sheet.schedule_text_change_check)
     
     def can_undo(self):
         """Check if undo is available"""
@@ -6771,8 +6982,8 @@ class UndoManager:
         total_size = 0
         for state in self.undo_stack + self.redo_stack:
             for sheet in state['sheets']:
-                total_size += len(sheet['content']) * 2  # Rough estimate for Unicode
-                total_size += len(sheet['name']) * 2
+                total_size += len(sheet.content) * 2  # Rough estimate for Unicode
+                total_size += len(sheet.name) * 2
             total_size += 100  # Overhead for other state data
         return total_size
 
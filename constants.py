@@ -203,14 +203,14 @@ COLORS = {
 }
 
 # LN variable colors for syntax highlighting
-LN_COLORS = [
+LN_COLORS = (
     "#FF9999", "#99FF99", "#9999FF", "#FFFF99", "#FF99FF", "#99FFFF",
     "#FFB366", "#B3FF66", "#66FFB3", "#B366FF", "#FF66B3", "#FF6666",
     "#66FF66", "#6666FF", "#FFFF66", "#FF66FF", "#66FFFF"
-]
+)
 
 # Function names for autocompletion and highlighting
-FUNCTION_NAMES = {
+FUNCTION_NAMES = frozenset({
     # Mathematical functions
     'sin', 'cos', 'tan', 'asin', 'acos', 'atan',
     'sinh', 'cosh', 'tanh', 'asinh', 'acosh', 'atanh',
@@ -223,7 +223,7 @@ FUNCTION_NAMES = {
     'geomean', 'harmmean', 'sumsq', 'perc5', 'perc95',
     # Special functions
     'tc', 'ar', 'd', 'tr', 'truncate'
-}
+})
 
 
 # =============================================================================
@@ -232,6 +232,8 @@ FUNCTION_NAMES = {
 
 # API configuration
 CURRENCY_API_AVAILABLE = True  # Set to False to disable API calls
+EXCHANGE_RATE_TTL = 600  # Seconds to reuse a live exchange rate
+EXCHANGE_RATE_RETRY_TTL = 60  # Seconds to reuse a fallback/unknown rate before asking the API again
 
 # Default values
 DEFAULT_DECIMAL_PLACES = 2